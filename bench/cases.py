@@ -0,0 +1,85 @@
+import io
+import os
+from contextlib import redirect_stdout
+
+from bench.fixtures import clip, image, make_tree, place
+
+# Every case has a prepare step, run by the parent outside the measurement, and a run step executed
+# in a fresh child process with the case folder as working directory. run returns the output paths.
+# The flag marks cases whose .mp4 outputs are real video and get decoded once to check them, the
+# sanitize tree is made of fake .mp4 files that are just a header followed by zeros.
+TOPIC = "bench"
+OUTRO = "ASSETS/OUTRO/OUTRO-001.mp4"
+TREE_FILES = 5000
+
+
+def prepare_trim(case_dir, fixtures_dir):
+    place(clip(fixtures_dir, "1080p", 60), os.path.join(case_dir, "clip.mp4"))
+
+def run_trim(mode):
+    def run():
+        from main import trim_video
+        return [trim_video("clip.mp4", 7.3, 11.1, mode)]
+    return run
+
+def prepare_assembly(resolutions, folder):
+    def prepare(case_dir, fixtures_dir):
+        place(clip(fixtures_dir, "1080p", 10), os.path.join(case_dir, OUTRO))
+        for i, resolution in enumerate(resolutions):
+            clip_folder = os.path.join(case_dir, "ASSETS", "VIDEOS", TOPIC, folder, str(i + 1))
+            place(clip(fixtures_dir, resolution, 30), os.path.join(clip_folder, "clip.mp4"))
+    return prepare
+
+def run_assemble_video():
+    from main import assemble_video
+    return [assemble_video(TOPIC, "1", False)]
+
+def run_assemble_videos():
+    from main import assemble_videos
+    return [assemble_videos(TOPIC, os.path.abspath(os.path.join("ASSETS", "VIDEOS", TOPIC, "assembly")), False)]
+
+def prepare_crop(case_dir, fixtures_dir):
+    place(image(fixtures_dir, 4000, 3000), os.path.join(case_dir, "image.jpg"))
+
+def run_crop():
+    from main import crop_image
+    # crop_image resolves relative paths against the repository, not the working directory
+    crop_image(os.path.abspath("image.jpg"))
+    return ["image.jpg"]
+
+def prepare_thumbnails(case_dir, fixtures_dir):
+    for i in range(100):
+        place(image(fixtures_dir, 1920, 1080, i % 10), os.path.join(case_dir, "source", f"{i:03d}.jpg"))
+
+def run_thumbnails():
+    from lib.thumbnail import process_thumbnails
+    process_thumbnails("source", "output")
+    return ["output"]
+
+def prepare_sanitize(warm):
+    def prepare(case_dir, fixtures_dir):
+        make_tree(os.path.join(case_dir, "topic"), TREE_FILES)
+        if warm:
+            from lib.utility import sanitize_files
+            with redirect_stdout(io.StringIO()):
+                sanitize_files(os.path.join(case_dir, "topic"))
+    return prepare
+
+def run_sanitize():
+    from lib.utility import sanitize_files
+    sanitize_files("topic")
+    return ["topic"]
+
+
+CASES = {
+    "trim_copy_1080p": (prepare_trim, run_trim("copy"), True),
+    "trim_smart_1080p": (prepare_trim, run_trim("smart"), True),
+    "trim_reencode_1080p": (prepare_trim, run_trim("reencode"), True),
+    "assemble_video_matching": (prepare_assembly(["1080p", "1080p", "1080p"], "1"), run_assemble_video, True),
+    "assemble_video_mixed": (prepare_assembly(["720p", "1080p", "4k"], "1"), run_assemble_video, True),
+    "assemble_videos_matching": (prepare_assembly(["1080p", "1080p", "1080p"], "assembly"), run_assemble_videos, True),
+    "crop_image_4000x3000": (prepare_crop, run_crop, False),
+    "thumbnails_100": (prepare_thumbnails, run_thumbnails, False),
+    "sanitize_cold": (prepare_sanitize(False), run_sanitize, False),
+    "sanitize_warm": (prepare_sanitize(True), run_sanitize, False),
+}
@@ -0,0 +1,72 @@
+import os
+import random
+import shutil
+import subprocess
+
+import numpy as np
+from PIL import Image
+
+from download.cache import link_or_copy
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080), "4k": (3840, 2160)}
+FPS = 24
+TIMESCALE = 12288  # Same video time base as the outro, so 1080p fixtures take the stream copy path
+
+
+def make_clip(path, width, height, seconds, audio=True):
+    # testsrc2 and sine are generated by ffmpeg itself, no network or sample files needed
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    command = ['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={FPS}:duration={seconds}']
+    if audio:
+        command += ['-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={seconds}', '-c:a', 'aac', '-ac', '2']
+    command += [
+        '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-g', str(FPS * 2),
+        '-video_track_timescale', str(TIMESCALE), '-f', 'mp4', f"{path}.tmp",
+    ]
+    subprocess.run(command, check=True)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+def clip(fixtures_dir, resolution, seconds, audio=True):
+    width, height = RESOLUTIONS[resolution]
+    name = f"clip_{resolution}_{seconds}s{'' if audio else '_silent'}.mp4"
+    return make_clip(os.path.join(fixtures_dir, name), width, height, seconds, audio)
+
+def make_image(path, width, height, seed=0):
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # A gradient with noise on top compresses like a photo, flat colors would make decoding unrealistically cheap
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    pixels = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    pixels += rng.normal(0, 24, pixels.shape)
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, format='JPEG', quality=90)
+    return path
+
+def image(fixtures_dir, width, height, seed=0):
+    return make_image(os.path.join(fixtures_dir, f"image_{width}x{height}_{seed}.jpg"), width, height, seed)
+
+def make_tree(root, count, seed=0):
+    # Extension-less and badly named files like the ones a topic folder collects from downloads
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    headers = [b'\x00\x00\x00\x18ftypisom', b'{"title": "clip"}', b'\xff\xd8\xff\xe0', b'plain text']
+    suffixes = ["", ".mp4", ".json", ".jpg", ".mjson"]
+    rng = random.Random(seed)
+    for i in range(count):
+        folder = os.path.join(root, f"topic {i // 500}", f"clip [{i // 50}]")
+        os.makedirs(folder, exist_ok=True)
+        name = f"Clip #{i}: 'the \"best\" part'?{rng.choice(suffixes)}"
+        with open(os.path.join(folder, name), 'wb') as file:
+            file.write(rng.choice(headers) + b'\x00' * rng.randint(0, 256))
+    return root
+
+def place(src_path, dst_path):
+    # Cases get hard links to the fixtures, outputs are always written as new files
+    os.makedirs(os.path.dirname(os.path.abspath(dst_path)), exist_ok=True)
+    link_or_copy(src_path, dst_path)
+    return dst_path
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import subprocess
+from datetime import datetime
+
+from bench.cases import CASES
+from edit.ffmpeg import decode_errors
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = ".bench"
+RESULT_MARKER = "BENCH_RESULT "
+REGRESSION_THRESHOLD = 0.10  # Slower or bigger by more than 10% counts as a regression
+
+
+def output_bytes(paths):
+    total = 0
+    for path in paths:
+        if path is None or not os.path.exists(path):
+            continue
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                total += sum(os.path.getsize(os.path.join(root, file)) for file in files)
+        else:
+            total += os.path.getsize(path)
+    return total
+
+def broken_outputs(paths):
+    # Every .mp4 output of a video case is decoded once, a fast case that writes undecodable video does not count
+    videos = []
+    for path in paths:
+        if path is None or not os.path.exists(path):
+            continue
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                videos += [os.path.join(root, file) for file in files if file.endswith(".mp4")]
+        elif path.endswith(".mp4"):
+            videos.append(path)
+    broken = []
+    for video in videos:
+        errors = decode_errors(video)
+        if errors:
+            broken.append(f"{video}: {errors.splitlines()[0]}")
+    return broken
+
+def run_child(name):
+    # Runs inside the case process, ru_maxrss is in kilobytes on Linux
+    started = time.perf_counter()
+    outputs = CASES[name][1]()
+    seconds = time.perf_counter() - started
+    decode = CASES[name][2]
+    result = {
+        "seconds": seconds,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "child_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,  # Peak of the ffmpeg processes
+        "output_bytes": output_bytes(outputs),
+        "decode_errors": broken_outputs(outputs) if decode else [],
+    }
+    print(RESULT_MARKER + json.dumps(result))
+
+def run_case(name, work_dir, repeat):
+    prepare = CASES[name][0]
+    fixtures_dir = os.path.abspath(os.path.join(work_dir, "fixtures"))
+    case_dir = os.path.abspath(os.path.join(work_dir, "cases", name))
+    samples = []
+    for i in range(repeat):
+        if os.path.exists(case_dir):
+            shutil.rmtree(case_dir)
+        os.makedirs(case_dir)
+        prepare(case_dir, fixtures_dir)
+
+        # A fresh interpreter per run, so peak RSS and warm caches never leak between cases
+        process = subprocess.run(
+            [sys.executable, '-m', 'bench.run', f'--child={name}'],
+            cwd=case_dir, env=dict(os.environ, PYTHONPATH=REPO_DIR), capture_output=True, text=True,
+        )
+        lines = [line for line in process.stdout.splitlines() if line.startswith(RESULT_MARKER)]
+        if process.returncode != 0 or not lines:
+            raise RuntimeError(f"{name} failed:\n{process.stdout[-2000:]}{process.stderr[-2000:]}")
+        samples.append(json.loads(lines[-1][len(RESULT_MARKER):]))
+
+    # Best wall time filters out scheduler noise, memory is reported at its worst
+    return {
+        "seconds": round(min(sample["seconds"] for sample in samples), 3),
+        "rss_mb": round(max(sample["rss_mb"] for sample in samples), 1),
+        "child_rss_mb": round(max(sample["child_rss_mb"] for sample in samples), 1),
+        "output_bytes": samples[-1]["output_bytes"],
+        "decode_errors": samples[-1]["decode_errors"],
+        "runs": repeat,
+    }
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    print(f"{'case':<26} {'seconds':>9} {'base':>9} {'change':>8} {'rss MB':>8} {'base':>8} {'output':>12}")
+    for name, result in results["cases"].items():
+        for error in result["decode_errors"]:
+            print(f"{name}: decode error in {error}")
+        if result["decode_errors"]:
+            regressions.append(name)
+        base = baseline["cases"].get(name) if baseline else None
+        if base is None:
+            print(f"{name:<26} {result['seconds']:>9.3f} {'-':>9} {'-':>8} {result['rss_mb']:>8.1f} {'-':>8} {result['output_bytes']:>12}")
+            continue
+        change = (result["seconds"] - base["seconds"]) / base["seconds"] if base["seconds"] else 0
+        flags = []
+        if change > threshold:
+            flags.append("SLOWER")
+        if base["rss_mb"] and (result["rss_mb"] - base["rss_mb"]) / base["rss_mb"] > threshold:
+            flags.append("MORE MEMORY")
+        if base["output_bytes"] and (result["output_bytes"] - base["output_bytes"]) / base["output_bytes"] > threshold:
+            flags.append("BIGGER")
+        print(
+            f"{name:<26} {result['seconds']:>9.3f} {base['seconds']:>9.3f} {change:>+8.1%} "
+            f"{result['rss_mb']:>8.1f} {base['rss_mb']:>8.1f} {result['output_bytes']:>12} {' '.join(flags)}"
+        )
+        if flags and name not in regressions:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the trim, assemble, thumbnail and sanitize paths offline')
+    parser.add_argument("--cases", help="Comma separated case names, all cases by default")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case, the fastest one is reported")
+    parser.add_argument("--work", default=WORK_DIR, help="Folder for fixtures and case outputs")
+    parser.add_argument("--output", help="Where to write the results JSON, defaults to <work>/results.json")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Relative change counted as a regression")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return
+
+    names = args.cases.split(",") if args.cases else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        exit(f"Unknown cases: {', '.join(unknown)}. Available: {', '.join(CASES)}")
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "cases": {},
+    }
+    for name in names:
+        print(f"Running {name}...")
+        results["cases"][name] = run_case(name, args.work, args.repeat)
+
+    output_path = args.output or os.path.join(args.work, "results.json")
+    with open(output_path, 'w') as file:
+        json.dump(results, file, indent=4)
+    print(f"Results written to '{output_path}'.")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        sys.exit(f"Regressions in: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+from commands import COMMANDS
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REGRESSION_THRESHOLD = 0.25  # Import times are noisy, only flag clear regressions
+
+
+def import_profile(modules):
+    # -X importtime writes "import time: self | cumulative | name" per module to stderr,
+    # top-level imports are the lines whose name is not indented
+    code = "; ".join(f"import {module}" for module in modules)
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=REPO_DIR, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {', '.join(modules)} failed:\n{process.stderr[-2000:]}")
+
+    top_level = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            top_level[name.strip()] = int(cumulative)
+    return wall, top_level
+
+def measure(target, repeat):
+    # target is "prompt" for the bare REPL or a command name
+    modules = ["main"] if target == "prompt" else ["main", f"commands.{target}"]
+    runs = [import_profile(modules) for i in range(repeat)]
+    wall, top_level = min(runs, key=lambda run: run[0])
+    heaviest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:3]
+    return {
+        "wall_ms": round(wall * 1000, 1),
+        "import_ms": round(sum(top_level.values()) / 1000, 1),
+        "heaviest": [f"{name} {microseconds / 1000:.0f}ms" for name, microseconds in heaviest],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Import cost of the REPL prompt and of every command')
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per target, the fastest one is reported")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    results = {target: measure(target, args.repeat) for target in ["prompt", *COMMANDS]}
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+
+    regressions = []
+    print(f"{'target':<12} {'wall ms':>9} {'import ms':>10} {'base':>8}  heaviest imports")
+    for target, result in results.items():
+        base = baseline.get(target)
+        flag = ""
+        if base and base["import_ms"] and (result["import_ms"] - base["import_ms"]) / base["import_ms"] > args.threshold:
+            flag = " SLOWER"
+            regressions.append(target)
+        print(
+            f"{target:<12} {result['wall_ms']:>9.1f} {result['import_ms']:>10.1f} "
+            f"{base['import_ms'] if base else '-':>8}  {', '.join(result['heaviest'])}{flag}"
+        )
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=4)
+    if regressions:
+        sys.exit(f"Slower imports for: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from apiclient.discovery import build_from_document
+from apiclient.http import build_http
+
+from upload.fake_api import FakeYouTubeServer
+from upload.session_store import UploadSessionStore
+from upload.upload_video import YouTubeUploader
+
+MB = 1024 * 1024
+
+
+class LocalUploader(YouTubeUploader):
+    # The real uploader, only the service is built against the local stand-in instead of Google
+    def __init__(self, server, chunk_size, session_store, adaptive):
+        super().__init__("client_secrets.json", chunk_size=chunk_size, session_store=session_store, interactive=False, progress=lambda progress: None)
+        self.ADAPTIVE_CHUNKS = adaptive
+        self.server = server
+        self.local = threading.local()
+
+    def get_authenticated_service(self):
+        if not hasattr(self.local, "service"):
+            self.local.service = build_from_document(self.server.discovery_document(), http=build_http())
+        return self.local.service
+
+
+def make_videos(work_dir, count, size):
+    # Random bytes, the stand-in never decodes them; a sibling .jpg keeps thumbnail extraction out of the timing
+    paths = []
+    for i in range(count):
+        path = os.path.join(work_dir, f"video_{i:03d}_{size}.mp4")
+        if not os.path.exists(path):
+            with open(path, 'wb') as file:
+                for offset in range(0, size, MB):
+                    file.write(os.urandom(min(MB, size - offset)))
+        with open(os.path.splitext(path)[0] + ".jpg", 'wb') as file:
+            file.write(b'\xff\xd8\xff\xe0' + b'\x00' * 1024)
+        paths.append(path)
+    return paths
+
+def upload_one(server, path, chunk_size, sessions, adaptive):
+    uploader = LocalUploader(server, chunk_size, sessions, adaptive)
+    started = time.time()
+    error = None
+    try:
+        uploader.initialize_upload({"file": path, "title": os.path.basename(path), "description": "", "set_thumbnail": True})
+    except Exception as e:
+        error = str(e)
+    return {
+        "path": path,
+        "started": started,
+        "seconds": time.time() - started,
+        "retries": uploader.retries,
+        "backoff_seconds": uploader.backoff_seconds,
+        "error": error,
+    }
+
+def run_config(work_dir, paths, chunk_size, parallel, latency, bandwidth, error_rate, seed, adaptive):
+    server = FakeYouTubeServer(latency=latency, bandwidth=bandwidth, error_rate=error_rate, seed=seed).start()
+    sessions = UploadSessionStore(os.path.join(work_dir, f"sessions_{chunk_size}_{parallel}.json"))
+    started = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            uploads = list(pool.map(lambda path: upload_one(server, path, chunk_size, sessions, adaptive), paths))
+    finally:
+        server.shutdown()
+        server.server_close()
+    wall = time.time() - started
+
+    # Time to first byte is client start until the stand-in saw the first byte of the file, matched by title
+    starts = {os.path.basename(upload["path"]): upload["started"] for upload in uploads}
+    ttfbs = [
+        session["first_byte"] - starts[session["metadata"]["snippet"]["title"]]
+        for session in server.sessions.values() if session["first_byte"]
+    ]
+    payload = sum(os.path.getsize(path) for path in paths)
+    return {
+        "chunk_mb": chunk_size / MB,
+        "parallel": parallel,
+        "uploads": len(uploads),
+        "failed": len([upload for upload in uploads if upload["error"]]),
+        "wall_seconds": round(wall, 3),
+        "mb_per_second": round(payload / MB / wall, 2),
+        "ttfb_seconds": round(sum(ttfbs) / len(ttfbs), 3) if ttfbs else None,
+        "retries": sum(upload["retries"] for upload in uploads),
+        "backoff_seconds": round(sum(upload["backoff_seconds"] for upload in uploads), 3),
+        # Bytes the stand-in read beyond the payload, chunks that were answered with an injected error
+        "resent_mb": round((server.stats["bytes_received"] - payload) / MB, 2),
+        "errors_injected": server.stats["errors_injected"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Upload throughput against a local YouTube API stand-in')
+    parser.add_argument("--size-mb", type=int, default=64, help="Size of every test video")
+    parser.add_argument("--videos", type=int, default=4, help="Videos uploaded per configuration")
+    parser.add_argument("--chunk-mb", default="1,8,32", help="Comma separated chunk sizes, multiples of 0.25")
+    parser.add_argument("--parallel", default="1,4", help="Comma separated numbers of concurrent uploads")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Added to every request")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0, help="Shared upload cap in megabits/s, 0 for none")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of chunks answered with a 5xx")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--adaptive", action="store_true", help="Let the uploader adapt the chunk size, --chunk-mb is then only the start")
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output) if args.output else None
+    work_dir = tempfile.mkdtemp(prefix="upload_throughput_")
+    # The uploader writes yt_upload.txt to the working directory
+    os.chdir(work_dir)
+    try:
+        paths = make_videos(work_dir, args.videos, args.size_mb * MB)
+        bandwidth = args.bandwidth_mbps * 1000 * 1000 / 8 if args.bandwidth_mbps else None
+        results = []
+        for chunk_mb in [float(value) for value in args.chunk_mb.split(",")]:
+            for parallel in [int(value) for value in args.parallel.split(",")]:
+                chunk_size = int(chunk_mb * 4) * 256 * 1024
+                print(f"Uploading {args.videos} x {args.size_mb} MB, {chunk_mb:g} MB chunks, {parallel} at a time...")
+                results.append(run_config(work_dir, paths, chunk_size, parallel, args.latency_ms / 1000, bandwidth, args.error_rate, args.seed, args.adaptive))
+    finally:
+        os.chdir("/")
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'chunk MB':>8} {'parallel':>8} {'MB/s':>8} {'TTFB s':>8} {'retries':>8} {'backoff s':>10} {'resent MB':>10} {'failed':>7}")
+    for result in results:
+        print(
+            f"{result['chunk_mb']:>8g} {result['parallel']:>8} {result['mb_per_second']:>8.2f} {result['ttfb_seconds'] or 0:>8.3f} "
+            f"{result['retries']:>8} {result['backoff_seconds']:>10.2f} {result['resent_mb']:>10.2f} {result['failed']:>7}"
+        )
+    if output_path:
+        with open(output_path, 'w') as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
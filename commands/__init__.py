@@ -0,0 +1,12 @@
+import importlib
+
+# Checked in order with startswith, like the old if/elif chain in main()
+COMMANDS = ("download", "trim", "thumbnails", "run", "metrics", "captions", "connect", "assemble", "upload")
+
+
+def find_command(command):
+    # A command module, and with it its dependencies, is only imported the first time the command is used
+    for name in COMMANDS:
+        if command.startswith(name):
+            return importlib.import_module(f"commands.{name}")
+    return None
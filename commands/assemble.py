@@ -0,0 +1,43 @@
+import os
+
+from edit.encode import ENCODE_WORKERS
+from edit.ffmpeg import DEFAULT_RESOLUTION, ENCODE_PRESET, ENCODE_CRF, RESOLUTIONS
+from main import assemble_videos
+
+
+def handle(command):
+    # Parse command arguments
+    args = command.split()
+
+    # Extract parameters from command
+    topic = None
+    id = ""
+    workers = ENCODE_WORKERS
+    preset = ENCODE_PRESET
+    crf = ENCODE_CRF
+    reencode = False
+    profile = DEFAULT_RESOLUTION
+
+    for arg in args:
+        if arg.startswith("--topic="):
+            topic = arg.split("=")[1]
+        elif arg.startswith("--id="):
+            id = arg.split("=")[1]
+        elif arg.startswith("--workers="):
+            workers = int(arg.split("=")[1])
+        elif arg.startswith("--preset="):
+            preset = arg.split("=")[1]
+        elif arg.startswith("--crf="):
+            crf = int(arg.split("=")[1])
+        elif arg == "--reencode":
+            reencode = True
+        elif arg.startswith("--profile="):
+            profile = arg.split("=")[1].lower()
+
+    if profile not in RESOLUTIONS:
+        print(f"Error: --profile must be one of {', '.join(RESOLUTIONS)}.")
+    elif topic:
+        output_dir = f"ASSETS/VIDEOS/{topic}"
+        assembly_folder = os.path.abspath(os.path.join(output_dir, "assembly"))
+        assemble_videos(topic, assembly_folder, True, workers, preset, crf, reencode, profile)
+        # assemble_video(topic, id)
@@ -0,0 +1,55 @@
+from download.captions import CAPTION_LANGUAGE, CAPTION_WORKERS, caption_index, clip_window, fetch_captions
+from main import extract_video_id, get_youtube_service
+from upload.limiter import QuotaLimiter
+
+
+def handle(command):
+    # Parse command arguments, --search= takes the rest of the line so the spoken line may contain spaces
+    search = None
+    if "--search=" in command:
+        command, search = command.split("--search=", 1)
+        search = search.strip().strip('"')
+    args = command.split()
+
+    # Extract parameters from command
+    video_ids = []
+    language = None  # Fetches default to CAPTION_LANGUAGE, searches to every language
+    workers = CAPTION_WORKERS
+    limit = 20
+
+    for arg in args:
+        if arg.startswith("--ids="):
+            video_ids += [video_id for video_id in arg.split("=", 1)[1].split(",") if video_id]
+        elif arg.startswith("--url="):
+            video_ids.append(extract_video_id(arg.split("=", 1)[1]))
+        elif arg.startswith("--file="):
+            # One video id or URL per line
+            with open(arg.split("=", 1)[1], 'r', encoding='utf-8') as file:
+                for line in file:
+                    line = line.strip()
+                    if line:
+                        video_ids.append(extract_video_id(line) or line)
+        elif arg.startswith("--language="):
+            language = arg.split("=")[1]
+        elif arg.startswith("--workers="):
+            workers = int(arg.split("=")[1])
+        elif arg.startswith("--limit="):
+            limit = int(arg.split("=")[1])
+
+    video_ids = [video_id for video_id in video_ids if video_id]
+    if video_ids:
+        counts = fetch_captions(get_youtube_service, video_ids, language or CAPTION_LANGUAGE, workers, QuotaLimiter())
+        print(
+            f"Captions: {counts['downloaded']} downloaded, {counts['cached']} from cache, {counts['indexed']} already indexed, "
+            f"{counts['none']} without {language or CAPTION_LANGUAGE} captions, {counts['failed']} failed."
+        )
+
+    if search:
+        hits = caption_index.search(search, limit, language)
+        print(f"{len(hits)} cues match '{search}':")
+        for hit in hits:
+            start, end = clip_window(hit["start"], hit["end"])
+            print(f"  --url=https://www.youtube.com/watch?v={hit['video_id']}&start={start}&end={end}  [{hit['language']}] {hit['text']}")
+
+    if not video_ids and not search:
+        print("Error: --ids=, --url=, --file= or --search= is required.")
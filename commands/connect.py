@@ -0,0 +1,6 @@
+from main import get_youtube_service
+
+
+def handle(command):
+    yt = get_youtube_service()
+    print(yt)
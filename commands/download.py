@@ -0,0 +1,64 @@
+import os
+
+from main import (
+    CLIPS_PER_ASSEMBLY, DOWNLOAD_WORKERS, assemble_videos, download_batch, download_segments_from_yt, parse_time_windows,
+    print_batch_summary, prompt_upload,
+)
+
+
+def handle(command):
+    args = command.split()
+    output_dir = None
+    youtube_urls = []
+    windows = []
+    topic = None
+    batch = False
+    workers = DOWNLOAD_WORKERS
+
+    for i, arg in enumerate(args):
+        if arg.startswith("--url"):
+            # Check if there are enough elements in the list
+            print("arg starts with url", arg)
+            if i < len(args):
+                start_index = arg.find("=") + 1  # Find the index of the first '=' sign and add 1 to exclude it
+                end_index = arg.find("&") if "&" in arg else len(arg)  # Find the index of the first '&' sign
+                youtube_url = arg[start_index:end_index]
+                youtube_urls.append(youtube_url)
+                # Parse every &start=..&end=.. window from the same argument, none means the whole video
+                windows.append(parse_time_windows(arg) or [(None, None)])
+                print("windows", windows[-1])
+            else:
+                print("Error: Insufficient arguments for URL.")
+                break  # Exit the loop if there are insufficient arguments
+        elif arg.startswith("--topic="):
+            topic = arg.split("=")[1]
+            output_dir = f"ASSETS/VIDEOS/{topic}"
+        elif arg == "--batch":
+            batch = True
+        elif arg.startswith("--workers="):
+            workers = int(arg.split("=")[1])
+
+    if topic == None:
+        output_dir = f"ASSETS/CLIPS"
+
+    if output_dir and batch:
+        os.makedirs(output_dir, exist_ok=True)
+        summary = download_batch(youtube_urls, windows, output_dir, topic, workers)
+        print_batch_summary(summary)
+
+    elif output_dir:
+        # Create the output directory if it doesn't exist
+        os.makedirs(output_dir, exist_ok=True)
+
+        for i, url in enumerate(youtube_urls):
+            assembly_folder = os.path.join(output_dir, "assembly")
+            os.makedirs(assembly_folder, exist_ok=True)  # Create the 'assembly' folder if it doesn't exist
+            for output_file_path in download_segments_from_yt(url, windows[i], assembly_folder):
+                prompt_upload(output_file_path)
+
+            assembly_folder = os.path.abspath(assembly_folder)
+            num_folders = len([name for name in os.listdir(assembly_folder) if os.path.isdir(os.path.join(assembly_folder, name))])
+
+            # Several windows per URL can add more than one folder at once
+            if num_folders >= CLIPS_PER_ASSEMBLY:
+                assemble_videos(topic, assembly_folder)
@@ -0,0 +1,14 @@
+from lib.metrics import metrics
+
+
+def handle(command):
+    args = command.split()
+    for arg in args:
+        if arg.startswith("--serve="):
+            port = int(arg.split("=")[1])
+            metrics.serve(port)
+            print(f"Serving metrics on http://0.0.0.0:{port}/metrics")
+        elif arg.startswith("--write="):
+            print(f"Metrics written to '{metrics.write_prometheus(arg.split('=')[1])}'.")
+    if len(args) == 1:
+        print(metrics.prometheus_text())
@@ -0,0 +1,14 @@
+from pipeline.runner import run_manifest
+
+
+def handle(command):
+    args = command.split()
+    manifest_path = None
+    for arg in args:
+        if arg.startswith("--manifest="):
+            manifest_path = arg.split("=")[1]
+
+    if manifest_path:
+        run_manifest(manifest_path)
+    else:
+        print("Error: --manifest= is required.")
@@ -0,0 +1,25 @@
+from lib.thumbnail import THUMBNAIL_WORKERS, process_thumbnails
+
+
+def handle(command):
+    # Parse command arguments
+    args = command.split()
+
+    # Extract parameters from command
+    source_dir = ""
+    output_dir = ""
+    workers = THUMBNAIL_WORKERS
+
+    for arg in args:
+        if arg.startswith("--source="):
+            source_dir = arg.split("=")[1]
+        elif arg.startswith("--output="):
+            output_dir = arg.split("=")[1]
+        elif arg.startswith("--workers="):
+            workers = int(arg.split("=")[1])
+
+    if source_dir and output_dir:
+        counts = process_thumbnails(source_dir, output_dir, workers=workers)
+        print(f"Thumbnails: {counts['rendered']} rendered, {counts['cached']} up to date, {counts['failed']} failed.")
+    else:
+        print("Error: --source= and --output= are required.")
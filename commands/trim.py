@@ -0,0 +1,24 @@
+from main import trim_video
+
+
+def handle(command):
+    # Parse command arguments
+    args = command.split()
+
+    # Extract parameters from command
+    path = ""
+    trim_start = 0
+    trim_end = 0
+    mode = "auto"
+
+    for arg in args:
+        if arg.startswith("--path="):
+            path = arg.split("=")[1]
+        elif arg.startswith("--trim_start="):
+            trim_start = arg.split("=")[1]
+        elif arg.startswith("--trim_end="):
+            trim_end = arg.split("=")[1]
+        elif arg.startswith("--mode="):
+            mode = arg.split("=")[1]
+
+    trim_video(path, trim_start, trim_end, mode)
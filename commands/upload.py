@@ -0,0 +1,50 @@
+import os
+
+from main import upload_to_youtube
+
+
+def handle(command):
+    # Parse command arguments
+    args = command.split()
+
+    # Extract parameters from command
+    video_path = ""
+    title = ""
+    description = ""
+    tags = ""
+    category = ""
+    privacy_status = ""
+    topic = ""
+    id = ""
+    scheduleDateTime = ""
+
+    for arg in args:
+        if arg.startswith("--video_path="):
+            video_path = arg.split("=")[1]
+        elif arg.startswith("--title="):
+            title = arg.split("=")[1]
+        elif arg.startswith("--description="):
+            description = arg.split("=")[1]
+        elif arg.startswith("--tags="):
+            tags = arg.split("=")[1]
+        elif arg.startswith("--category="):
+            category = arg.split("=")[1]
+        elif arg.startswith("--privacy_status="):
+            privacy_status = arg.split("=")[1]
+        elif arg.startswith("--topic="):
+            topic = arg.split("=")[1]
+        elif arg.startswith("--id="):
+            id = arg.split("=")[1]
+        elif arg.startswith("--scheduleDateTime="):
+            scheduleDateTime = arg.split("=")[1]
+
+    if not video_path and topic and id:
+        directory = os.path.join("ASSETS", "VIDEOS", topic, id)
+        # Assuming the first MP4 file is what you want
+        for file_name in os.listdir(directory):
+            if file_name.endswith(".mp4"):
+                video_path = os.path.join(directory, file_name)
+                break  # Stop after finding the first MP4 file
+
+    # Call upload_to_youtube function
+    upload_to_youtube(video_path, title, description, tags, category, privacy_status, scheduleDateTime)
@@ -0,0 +1,162 @@
+import os
+import json
+import shutil
+import subprocess
+import threading
+import time
+
+from lib.storage import atomic_write
+
+CACHE_DIR = "ASSETS/CACHE/SEGMENTS"
+CACHE_MAX_BYTES = 20 * 1024 * 1024 * 1024  # 20 GB
+INDEX_FILE = "index.json"
+
+
+class SegmentCache():
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        self.lock = threading.Lock()
+        self.index = None  # Loaded on first use
+
+    def load_index(self):
+        if self.index is None:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r') as file:
+                    self.index = json.load(file)
+            else:
+                self.index = {"videos": {}, "segments": {}}
+        return self.index
+
+    def save_index(self):
+        with atomic_write(self.index_path) as file:
+            json.dump(self.index, file, indent=4)
+
+    def segment_key(self, video_id, itag, start, end):
+        return f"{video_id}_{itag}_{start:g}_{end:g}"
+
+    def get_video(self, video_id):
+        # Metadata of a resolved video (title, itag, length), lets a hit skip pytube entirely
+        with self.lock:
+            return self.load_index()["videos"].get(video_id)
+
+    def put_video(self, video_id, title, itag, length, thumbnail=None):
+        video_dir = os.path.join(self.cache_dir, video_id)
+        os.makedirs(video_dir, exist_ok=True)
+        if thumbnail is not None:
+            with open(os.path.join(video_dir, "thumbnail.jpg"), 'wb') as thumbnail_file:
+                thumbnail_file.write(thumbnail)
+
+        with self.lock:
+            self.load_index()["videos"][video_id] = {
+                "title": title,
+                "itag": itag,
+                "length": length,
+                "thumbnail": thumbnail is not None,
+            }
+            self.save_index()
+
+    def thumbnail_path(self, video_id):
+        video = self.get_video(video_id)
+        if video and video["thumbnail"]:
+            path = os.path.join(self.cache_dir, video_id, "thumbnail.jpg")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def find_segment(self, video_id, itag, start, end):
+        # Prefer an exact match, otherwise the smallest cached window containing [start, end]
+        segments = self.load_index()["segments"]
+        exact = segments.get(self.segment_key(video_id, itag, start, end))
+        if exact:
+            return exact
+
+        best = None
+        for segment in segments.values():
+            if segment["video_id"] != video_id or segment["itag"] != itag:
+                continue
+            if segment["start"] <= start and segment["end"] >= end:
+                if best is None or segment["end"] - segment["start"] < best["end"] - best["start"]:
+                    best = segment
+        return best
+
+    def fetch(self, video_id, itag, start, end, output_file_path):
+        with self.lock:
+            segment = self.find_segment(video_id, itag, start, end)
+            if segment is None:
+                return False
+            segment_path = os.path.join(self.cache_dir, segment["file"])
+            if not os.path.exists(segment_path):
+                # The file was removed behind our back, forget about it
+                del self.load_index()["segments"][self.segment_key(video_id, itag, segment["start"], segment["end"])]
+                self.save_index()
+                return False
+            segment["last_access"] = time.time()
+            self.save_index()
+
+        if segment["start"] == start and segment["end"] == end:
+            print(f"Serving {video_id} [{start}-{end}] from cache")
+            link_or_copy(segment_path, output_file_path)
+        else:
+            # Cut the requested window locally out of the cached superset
+            print(f"Cutting {video_id} [{start}-{end}] from cached [{segment['start']}-{segment['end']}]")
+            command = [
+                'ffmpeg', '-y', '-ss', str(start - segment["start"]), '-i', segment_path, '-t', str(end - start),
+                '-c:v', 'copy', '-c:a', 'copy', '-f', 'mp4', f"{output_file_path}.part",
+            ]
+            result = subprocess.run(command)
+            if result.returncode != 0:
+                if os.path.exists(f"{output_file_path}.part"):
+                    os.remove(f"{output_file_path}.part")
+                return False
+            os.replace(f"{output_file_path}.part", output_file_path)
+        return True
+
+    def store(self, video_id, itag, start, end, file_path):
+        if not os.path.exists(file_path):
+            return
+
+        key = self.segment_key(video_id, itag, start, end)
+        relative_path = os.path.join(video_id, f"{key}.mp4")
+        segment_path = os.path.join(self.cache_dir, relative_path)
+        os.makedirs(os.path.dirname(segment_path), exist_ok=True)
+        # A copy interrupted halfway stays a .tmp file and is never indexed
+        link_or_copy(file_path, f"{segment_path}.tmp")
+        os.replace(f"{segment_path}.tmp", segment_path)
+
+        with self.lock:
+            self.load_index()["segments"][key] = {
+                "video_id": video_id,
+                "itag": itag,
+                "start": start,
+                "end": end,
+                "file": relative_path,
+                "size": os.path.getsize(segment_path),
+                "last_access": time.time(),
+            }
+            self.evict()
+            self.save_index()
+
+    def evict(self):
+        # Drop least recently used segments until the cache fits in max_bytes
+        segments = self.index["segments"]
+        total_size = sum(segment["size"] for segment in segments.values())
+        for key, segment in sorted(segments.items(), key=lambda item: item[1]["last_access"]):
+            if total_size <= self.max_bytes:
+                break
+            segment_path = os.path.join(self.cache_dir, segment["file"])
+            if os.path.exists(segment_path):
+                os.remove(segment_path)
+            total_size -= segment["size"]
+            del segments[key]
+
+
+def link_or_copy(src_path, dst_path):
+    if os.path.exists(dst_path):
+        os.remove(dst_path)
+    try:
+        # Hard links cost no extra disk space when cache and assets share a filesystem
+        os.link(src_path, dst_path)
+    except OSError:
+        shutil.copy2(src_path, dst_path)
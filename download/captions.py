@@ -0,0 +1,178 @@
+import os
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from lib.storage import Database, atomic_write
+
+CAPTIONS_DIR = "ASSETS/CACHE/CAPTIONS"
+CAPTION_INDEX_PATH = "ASSETS/CACHE/CAPTIONS/index.sqlite"
+CAPTION_WORKERS = 4
+CAPTION_LANGUAGE = "en"
+WINDOW_PADDING = 2  # Seconds added around a matching cue when it is turned into a clip window
+
+SRT_TIME = re.compile(r'(\d+):(\d+):(\d+)[,.](\d+)\s*-->\s*(\d+):(\d+):(\d+)[,.](\d+)')
+TAGS = re.compile(r'<[^>]+>|\{[^}]+\}')
+
+
+def parse_srt(content):
+    # Returns (start, end, text) per cue, formatting tags and line breaks inside a cue are dropped
+    cues = []
+    for block in re.split(r'\r?\n\s*\r?\n', content.strip()):
+        lines = block.strip().splitlines()
+        for i, line in enumerate(lines):
+            match = SRT_TIME.search(line)
+            if match:
+                h1, m1, s1, ms1, h2, m2, s2, ms2 = map(int, match.groups())
+                text = TAGS.sub('', " ".join(lines[i + 1:])).strip()
+                if text:
+                    cues.append((h1 * 3600 + m1 * 60 + s1 + ms1 / 1000, h2 * 3600 + m2 * 60 + s2 + ms2 / 1000, text))
+                break
+    return cues
+
+def clip_window(start, end, padding=WINDOW_PADDING):
+    # "M:SS" like the &start=..&end=.. windows of the download command
+    start = max(0, int(start - padding))
+    end = int(end + padding + 0.999)
+    return f"{start // 60}:{start % 60:02d}", f"{end // 60}:{end % 60:02d}"
+
+
+# One row per video and language that was looked up, with or without captions, and the cues of the ones
+# that had them. Cues go into an FTS5 table when SQLite was built with it, a plain table searched with LIKE otherwise.
+class CaptionIndex(Database):
+    def __init__(self, db_path=CAPTION_INDEX_PATH):
+        super().__init__(db_path)
+        self.fts = False
+
+    def create_schema(self, connection):
+        with connection:
+            # Indexes from before languages were told apart are rebuilt, the SRT files on disk are indexed again
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(cues)")]
+            if columns and "language" not in columns:
+                connection.execute("DROP TABLE IF EXISTS videos")
+                connection.execute("DROP TABLE IF EXISTS cues")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS videos ("
+                "video_id TEXT, language TEXT, caption_id TEXT, fetched_at TEXT, PRIMARY KEY (video_id, language))"
+            )
+            try:
+                connection.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS cues USING fts5("
+                    "text, video_id UNINDEXED, language UNINDEXED, start UNINDEXED, end UNINDEXED, tokenize='unicode61')"
+                )
+                self.fts = True
+            except sqlite3.OperationalError:
+                connection.execute("CREATE TABLE IF NOT EXISTS cues (text TEXT, video_id TEXT, language TEXT, start REAL, end REAL)")
+                connection.execute("CREATE INDEX IF NOT EXISTS cues_video ON cues (video_id, language)")
+
+    def known(self, video_ids, language):
+        placeholders = ",".join("?" * len(video_ids))
+        with self.lock:
+            rows = self.connect().execute(
+                f"SELECT video_id FROM videos WHERE language = ? AND video_id IN ({placeholders})", [language, *video_ids]
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def store(self, video_id, caption_id, language, cues):
+        # caption_id None records that the video has no captions in this language, so it is not asked again
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute("DELETE FROM cues WHERE video_id = ? AND language = ?", (video_id, language))
+                connection.executemany(
+                    "INSERT INTO cues (text, video_id, language, start, end) VALUES (?, ?, ?, ?, ?)",
+                    [(text, video_id, language, start, end) for start, end, text in cues],
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO videos (video_id, caption_id, language, fetched_at) VALUES (?, ?, ?, ?)",
+                    (video_id, caption_id, language, datetime.now().isoformat(timespec="seconds")),
+                )
+
+    def search(self, query, limit=20, language=None):
+        # language None searches the cues of every language
+        languages = [language] if language else []
+        language_filter = " AND language = ?" if language else ""
+        with self.lock:
+            connection = self.connect()
+            if self.fts:
+                # Quoted, so the spoken line is matched as a phrase and FTS operators in it are ignored
+                phrase = '"' + query.replace('"', '""') + '"'
+                rows = connection.execute(
+                    f"SELECT video_id, language, start, end, text FROM cues WHERE cues MATCH ?{language_filter} ORDER BY rank LIMIT ?",
+                    (phrase, *languages, limit),
+                ).fetchall()
+            else:
+                rows = connection.execute(
+                    f"SELECT video_id, language, start, end, text FROM cues WHERE text LIKE ?{language_filter} ORDER BY video_id, start LIMIT ?",
+                    (f"%{query}%", *languages, limit),
+                ).fetchall()
+        return [
+            {"video_id": video_id, "language": language, "start": start, "end": end, "text": text}
+            for video_id, language, start, end, text in rows
+        ]
+
+
+caption_index = CaptionIndex()
+
+
+def find_caption_track(youtube, video_id, language=CAPTION_LANGUAGE):
+    # Uploaded captions are preferred over YouTube's automatic speech recognition
+    response = youtube.captions().list(part='snippet', videoId=video_id).execute()
+    tracks = [item for item in response.get('items', []) if item['snippet']['language'] == language]
+    tracks.sort(key=lambda item: item['snippet'].get('trackKind') == 'asr')
+    return tracks[0]['id'] if tracks else None
+
+def download_srt(youtube, caption_id, output_path):
+    content = youtube.captions().download(id=caption_id, tfmt='srt').execute()
+    with atomic_write(output_path, 'wb') as file:
+        file.write(content)
+    return content.decode('utf-8', errors='replace')
+
+def fetch_caption(get_service, video_id, language, quota, index, captions_dir):
+    srt_path = os.path.join(captions_dir, f"{video_id}.{language}.srt")
+    id_path = os.path.join(captions_dir, f"{video_id}.{language}.id")
+    if os.path.exists(srt_path) and os.path.exists(id_path):
+        # Downloaded before but never indexed, e.g. an interrupted run
+        with open(id_path, 'r', encoding='utf-8') as file:
+            caption_id = file.read().strip()
+        with open(srt_path, 'r', encoding='utf-8', errors='replace') as file:
+            index.store(video_id, caption_id, language, parse_srt(file.read()))
+        return "cached"
+
+    youtube = get_service()
+    if quota is not None:
+        quota.reserve("captions.list")
+    caption_id = find_caption_track(youtube, video_id, language)
+    if caption_id is None:
+        index.store(video_id, None, language, [])
+        return "none"
+
+    # Written before the SRT, so a cached SRT always comes with the id of the track it was downloaded from
+    with atomic_write(id_path) as file:
+        file.write(caption_id)
+    if quota is not None:
+        quota.reserve("captions.download")
+    content = download_srt(youtube, caption_id, srt_path)
+    index.store(video_id, caption_id, language, parse_srt(content))
+    return "downloaded"
+
+def fetch_captions(get_service, video_ids, language=CAPTION_LANGUAGE, workers=CAPTION_WORKERS, quota=None, index=caption_index, captions_dir=CAPTIONS_DIR):
+    # get_service returns the pooled API client of the calling thread, one list and at most one download per new video
+    os.makedirs(captions_dir, exist_ok=True)
+    video_ids = list(dict.fromkeys(video_ids))
+    known = index.known(video_ids, language) if video_ids else set()
+    counts = {"indexed": len(known), "cached": 0, "downloaded": 0, "none": 0, "failed": 0}
+    pending = [video_id for video_id in video_ids if video_id not in known]
+
+    def job(video_id):
+        try:
+            return fetch_caption(get_service, video_id, language, quota, index, captions_dir)
+        except Exception as e:
+            print(f"Captions for '{video_id}' failed: {e}")
+            return "failed"
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for status in pool.map(job, pending):
+            counts[status] += 1
+    return counts
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+
+from lib.media_index import media_index
+from edit.encode import ENCODE_WORKERS, normalize_audio, normalize_clips
+from edit.loudness import loudnorm_filter, measure_clips
+from edit.ffmpeg import AUDIO_ENCODERS, INBAND_TAGS, ENCODE_PRESET, ENCODE_CRF, concat_copy
+
+# Used when the outro itself cannot serve as the reference. The level is left open, it follows from the frame size.
+DEFAULT_PROFILE = {
+    "codec": "h264",
+    "width": 1920,
+    "height": 1080,
+    "pix_fmt": "yuv420p",
+    "profile": "High",  # What libx264 writes for 8-bit 4:2:0
+    "fps": "24/1",
+    "time_base": "1/12288",
+    "audio_codec": "aac",
+    "sample_rate": 44100,
+    "channels": 2,
+}
+
+
+def signature(info):
+    # The stream parameters that have to be identical for the concat demuxer to stream copy. Differing
+    # SPS/PPS are carried in-band by concat_copy, a different profile or level means a re-encode.
+    if info is None or info["video"] is None or info["audio"] is None:
+        return None
+    video = info["video"]
+    audio = info["audio"]
+    return {
+        "codec": video["codec"],
+        "width": video["width"],
+        "height": video["height"],
+        "pix_fmt": video["pix_fmt"],
+        "fps": video["fps"],
+        "time_base": video["time_base"],
+        "profile": video.get("profile"),
+        "level": video.get("level"),
+        "audio_codec": audio["codec"],
+        "sample_rate": audio["sample_rate"],
+        "channels": audio["channels"],
+    }
+
+def matches(info, reference):
+    # Only the parameters the reference pins down are compared
+    clip = signature(info)
+    return clip is not None and all(clip[key] == value for key, value in reference.items())
+
+def reference_signature(info, width, height):
+    # The outro is part of every assembly, so clips matching it can be copied untouched
+    reference = signature(info)
+    if reference is None or reference["codec"] not in INBAND_TAGS or reference["audio_codec"] not in AUDIO_ENCODERS:
+        return dict(DEFAULT_PROFILE, width=width, height=height)
+    if (reference["width"], reference["height"]) != (width, height):
+        # The outro is encoded to the target size as well, clips already at that size with its other
+        # parameters stay copies. Their level depends on the frame size and is not compared.
+        reference = dict(reference, width=width, height=height)
+        del reference["level"]
+    return reference
+
+def assemble(input_paths, output_path, width=1920, height=1080, preset=ENCODE_PRESET, crf=ENCODE_CRF, workers=ENCODE_WORKERS, reencode=False, loudness=True):
+    # The last input is the outro and sets the reference stream parameters
+    infos = [media_index.info(input_path) for input_path in input_paths]
+    reference = reference_signature(infos[-1], width, height)
+    # Cached per clip, only clips that were never assembled before are analyzed
+    audio_filters = [loudnorm_filter(measurement) for measurement in measure_clips(input_paths)] if loudness else [None] * len(input_paths)
+
+    work_dir = tempfile.mkdtemp(prefix="assemble_", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        parts = list(input_paths)
+        mismatched = []
+        louder = []
+        for i, (input_path, info, audio_filter) in enumerate(zip(input_paths, infos, audio_filters)):
+            # reencode forces every clip through the encoder, e.g. to apply a different CRF
+            if reencode or not matches(info, reference):
+                if info is None or info["video"] is None:
+                    raise RuntimeError(f"'{input_path}' has no readable video stream")
+                print(f"Re-encoding '{input_path}' to match the assembly profile")
+                parts[i] = os.path.join(work_dir, f"{i:03d}.mp4")
+                mismatched.append((input_path, info, parts[i], audio_filter))
+            elif audio_filter:
+                # The video can still be copied, the gain is applied while the audio is encoded again
+                print(f"Adjusting the loudness of '{input_path}'")
+                parts[i] = os.path.join(work_dir, f"{i:03d}.mp4")
+                louder.append((input_path, info, parts[i], audio_filter))
+
+        if mismatched:
+            normalize_clips(mismatched, reference, work_dir, workers, preset, crf)
+        if louder:
+            normalize_audio(louder, reference, work_dir, workers)
+        concat_copy(parts, output_path, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "copied": len(input_paths) - len(mismatched) - len(louder),
+        "reencoded": len(mismatched),
+        "loudness": len(louder) + len([clip for clip in mismatched if clip[3]]),
+    }
@@ -0,0 +1,131 @@
+import os
+import time
+from fractions import Fraction
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.media_index import media_index
+from lib.metrics import metrics
+from edit.ffmpeg import VIDEO_ENCODERS, AUDIO_ENCODERS, ENCODE_PRESET, ENCODE_CRF, concat_copy, run_ffmpeg
+
+CPU_COUNT = os.cpu_count() or 1
+ENCODE_WORKERS = max(1, CPU_COUNT // 4)  # Parallel ffmpeg encoders, each gets CPU_COUNT / workers threads
+MIN_SEGMENT_SECONDS = 10  # Shorter segments cost more in encoder start-up than they gain
+
+
+def split_points(keyframe_times, duration, segments):
+    # Cut at the keyframes closest to equal splits of the timeline
+    points = [0.0]
+    for i in range(1, segments):
+        target = duration * i / segments
+        keyframe = min(keyframe_times, key=lambda time: abs(time - target), default=None)
+        if keyframe is not None and keyframe - points[-1] >= MIN_SEGMENT_SECONDS and duration - keyframe >= MIN_SEGMENT_SECONDS:
+            points.append(keyframe)
+    points.append(duration)
+    return list(zip(points[:-1], points[1:]))
+
+def fit_filter(info, reference):
+    # Sources already at the target size skip the scaler, the rest are scaled to fit and letterboxed instead of stretched
+    width, height = reference["width"], reference["height"]
+    if (info["video"]["width"], info["video"]["height"]) == (width, height):
+        return 'setsar=1'
+    return (
+        f'scale={width}:{height}:force_original_aspect_ratio=decrease:force_divisible_by=2,'
+        f'pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1'
+    )
+
+def video_args(reference, info, preset, crf, threads):
+    return [
+        '-vf', f'{fit_filter(info, reference)},fps={reference["fps"]},format={reference["pix_fmt"]}',
+        '-c:v', VIDEO_ENCODERS[reference["codec"]], '-preset', preset, '-crf', str(crf), '-threads', str(threads),
+        '-video_track_timescale', reference["time_base"].split("/")[1],
+    ]
+
+def encode_video_segment(input_path, output_path, start, end, arguments):
+    # Seeking on the input while transcoding is frame accurate, each segment starts with its own IDR frame
+    run_ffmpeg(
+        ['ffmpeg', '-y', '-ss', str(start), '-i', input_path, '-t', str(end - start), '-map', '0:v:0', '-an', *arguments, output_path],
+        f"encode {start:.2f}-{end:.2f}s of '{input_path}'",
+    )
+
+def encode_audio(input_path, output_path, info, reference, audio_filter=None):
+    command = ['ffmpeg', '-y', '-i', input_path]
+    if info["audio"] is None:
+        # Give silent clips an audio track so the concat demuxer sees matching streams
+        layout = "stereo" if reference["channels"] == 2 else "mono"
+        command += ['-f', 'lavfi', '-i', f'anullsrc=r={reference["sample_rate"]}:cl={layout}', '-map', '1:a:0']
+    else:
+        command += ['-map', '0:a:0']
+        if audio_filter:
+            command += ['-af', audio_filter]
+    command += [
+        '-vn', '-t', str(info["duration"]),
+        '-c:a', AUDIO_ENCODERS[reference["audio_codec"]], '-ar', str(reference["sample_rate"]), '-ac', str(reference["channels"]),
+        output_path,
+    ]
+    run_ffmpeg(command, f"encode the audio of '{input_path}'")
+
+def normalize_clips(clips, reference, work_dir, workers=ENCODE_WORKERS, preset=ENCODE_PRESET, crf=ENCODE_CRF):
+    # clips is a list of (input_path, info, output_path, audio_filter). The video of every clip is split at keyframes
+    # and all segments of all clips share one pool, so short clips still keep every worker busy.
+    # The pool runs threads, the actual encoding happens in the ffmpeg child processes.
+    threads = max(1, CPU_COUNT // workers)
+    tasks = []
+    plans = []
+    for index, (input_path, info, output_path, audio_filter) in enumerate(clips):
+        duration = info["duration"]
+        if workers > 1 and duration >= 2 * MIN_SEGMENT_SECONDS:
+            segments = split_points(media_index.keyframes(input_path), duration, workers)
+        else:
+            segments = [(0.0, duration)]
+
+        arguments = video_args(reference, info, preset, crf, threads)
+        segment_paths = []
+        for number, (start, end) in enumerate(segments):
+            segment_path = os.path.join(work_dir, f"{index:03d}_video_{number:03d}.mp4")
+            segment_paths.append(segment_path)
+            tasks.append((encode_video_segment, (input_path, segment_path, start, end, arguments)))
+        audio_path = os.path.join(work_dir, f"{index:03d}_audio.m4a")
+        tasks.append((encode_audio, (input_path, audio_path, info, reference, audio_filter)))
+        plans.append((output_path, segment_paths, audio_path))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(function, *args) for function, args in tasks]
+        for future in futures:
+            future.result()
+    seconds = time.perf_counter() - started
+
+    # Output frames per wall second over all workers, the number to watch when tuning workers and preset
+    frames = sum(info["duration"] for input_path, info, output_path, audio_filter in clips) * float(Fraction(reference["fps"]))
+    metrics.set("encode_fps", round(frames / seconds, 2) if seconds > 0 else 0, preset=preset)
+    metrics.observe("encode_seconds", seconds, preset=preset)
+    metrics.record("encode", seconds=round(seconds, 3), clips=len(clips), frames=int(frames), workers=workers, preset=preset, crf=crf)
+
+    # Stitch the segments back together without touching the encoded packets
+    for output_path, segment_paths, audio_path in plans:
+        video_path = f"{output_path}.video.mp4"
+        concat_copy(segment_paths, video_path, work_dir)
+        run_ffmpeg(
+            ['ffmpeg', '-y', '-i', video_path, '-i', audio_path, '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', '-shortest',
+             '-video_track_timescale', reference["time_base"].split("/")[1], output_path],
+            f"mux '{output_path}'",
+        )
+        os.remove(video_path)
+
+def normalize_audio(clips, reference, work_dir, workers=ENCODE_WORKERS):
+    # clips is a list of (input_path, info, output_path, audio_filter) whose video already matches the
+    # reference, only the audio is encoded again and muxed with the untouched video packets
+    def job(index, input_path, info, output_path, audio_filter):
+        audio_path = os.path.join(work_dir, f"{index:03d}_gain.m4a")
+        encode_audio(input_path, audio_path, info, reference, audio_filter)
+        run_ffmpeg(
+            ['ffmpeg', '-y', '-i', input_path, '-i', audio_path, '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', '-shortest',
+             '-video_track_timescale', reference["time_base"].split("/")[1], output_path],
+            f"mux '{output_path}'",
+        )
+        os.remove(audio_path)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(job, index, *clip) for index, clip in enumerate(clips)]
+        for future in futures:
+            future.result()
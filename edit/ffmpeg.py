@@ -0,0 +1,71 @@
+import os
+import subprocess
+
+from lib.media import run_ffprobe
+
+ENCODE_PRESET = "medium"
+ENCODE_CRF = 23
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080), "4k": (3840, 2160)}
+DEFAULT_RESOLUTION = "1080p"
+VIDEO_ENCODERS = {"h264": "libx264", "hevc": "libx265", "mpeg4": "mpeg4"}
+AUDIO_ENCODERS = {"aac": "aac", "mp3": "libmp3lame"}
+# MP4 sample entries that allow SPS/PPS inside the stream, so parts from different encoders can share one track
+INBAND_TAGS = {"h264": "avc3", "hevc": "hev1"}
+
+
+def run_ffmpeg(command, description):
+    result = subprocess.run(command)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to {description}")
+
+def parameter_sets(path):
+    # Codec and a hash of the SPS/PPS (the extradata) of the first video stream, None without video
+    data = run_ffprobe(['-select_streams', 'v:0', '-show_data_hash', 'md5', '-show_entries', 'stream=codec_name,extradata_hash', path])
+    streams = data.get("streams", []) if data else []
+    if not streams:
+        return None
+    return streams[0].get("codec_name"), streams[0].get("extradata_hash")
+
+def decode_errors(path):
+    # Everything the decoder complains about while reading the whole file, empty for a clean file
+    result = subprocess.run(['ffmpeg', '-v', 'error', '-i', path, '-f', 'null', '-'], capture_output=True, text=True)
+    if result.returncode != 0 and not result.stderr:
+        return f"ffmpeg exited with {result.returncode}"
+    return result.stderr.strip()
+
+def write_concat_list(input_paths, list_path):
+    with open(list_path, 'w', encoding='utf-8') as list_file:
+        for input_path in input_paths:
+            escaped_path = os.path.abspath(input_path).replace("'", "'\\''")
+            list_file.write(f"file '{escaped_path}'\n")
+
+def concat_copy(input_paths, output_path, work_dir):
+    # An MP4 track keeps the parameter sets of its first part only. Parts from different encoders are
+    # therefore joined as Annex-B transport streams, which repeat SPS/PPS before every keyframe, and the
+    # result is tagged avc3/hev1 so the parameter sets may stay in the stream.
+    list_path = os.path.join(work_dir, f"{os.path.basename(output_path)}.concat.txt")
+    sets = [parameter_sets(input_path) for input_path in input_paths]
+    ts_paths = []
+    tag_args = []
+    if len(set(sets)) > 1:
+        codecs = {parameter_set[0] for parameter_set in sets if parameter_set}
+        if len(codecs) != 1 or not codecs <= set(INBAND_TAGS):
+            raise RuntimeError(f"Cannot stream copy {', '.join(sorted(map(str, codecs)))} parts with different parameter sets into '{output_path}'")
+        codec = codecs.pop()
+        for i, input_path in enumerate(input_paths):
+            ts_path = os.path.join(work_dir, f"{os.path.basename(output_path)}.{i:03d}.ts")
+            run_ffmpeg(
+                ['ffmpeg', '-y', '-i', input_path, '-map', '0', '-c', 'copy', '-bsf:v', f'{codec}_mp4toannexb', '-f', 'mpegts', ts_path],
+                f"remux '{input_path}' for concatenation",
+            )
+            ts_paths.append(ts_path)
+        input_paths = ts_paths
+        tag_args = ['-tag:v', INBAND_TAGS[codec]]
+    write_concat_list(input_paths, list_path)
+
+    command = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', *tag_args, '-movflags', '+faststart', output_path]
+    run_ffmpeg(command, f"concatenate into '{output_path}'")
+    for ts_path in ts_paths:
+        os.remove(ts_path)
+    # A later remux of the result has to keep the tag
+    return tag_args[1] if tag_args else None
@@ -0,0 +1,74 @@
+import os
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.metrics import metrics
+from lib.storage import atomic_write
+
+LOUDNESS_TARGET = -14.0  # Integrated LUFS, what YouTube normalizes playback to
+TRUE_PEAK = -1.5  # dBTP
+LOUDNESS_RANGE = 11.0
+LOUDNESS_TOLERANCE = 1.0  # LU, clips this close to the target keep their audio untouched
+MEASURE_WORKERS = 4
+
+
+def sidecar_path(path):
+    # Next to the clip like its .txt and .jpg, so the measurement moves and gets deleted with it
+    return os.path.splitext(path)[0] + ".loudness.json"
+
+def measure(path):
+    # The analysis pass of loudnorm, it prints its measurement as JSON at the end of stderr
+    command = [
+        'ffmpeg', '-hide_banner', '-nostats', '-i', path, '-map', '0:a:0', '-vn',
+        '-af', f'loudnorm=I={LOUDNESS_TARGET}:TP={TRUE_PEAK}:LRA={LOUDNESS_RANGE}:print_format=json', '-f', 'null', '-',
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0 or "{" not in result.stderr:
+        return None
+    data = json.loads(result.stderr[result.stderr.rindex("{"):result.stderr.rindex("}") + 1])
+    return {
+        "input_i": float(data["input_i"]),
+        "input_tp": float(data["input_tp"]),
+        "input_lra": float(data["input_lra"]),
+        "input_thresh": float(data["input_thresh"]),
+        "target_offset": float(data["target_offset"]),
+    }
+
+def loudness(path):
+    # Measured once per clip, the sidecar is trusted as long as the clip keeps its size and mtime.
+    # None for clips without audio, those are measured again only if the clip changes.
+    stat = os.stat(path)
+    key = [stat.st_size, stat.st_mtime_ns]
+    cache_path = sidecar_path(path)
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as file:
+            cached = json.load(file)
+        if cached.get("key") == key:
+            metrics.count("loudness_cache_hits_total")
+            return cached["loudness"]
+
+    with metrics.timer("loudness_measure_seconds") as fields:
+        value = measure(path)
+        fields.update(file=os.path.basename(path))
+    with atomic_write(cache_path) as file:
+        json.dump({"key": key, "loudness": value}, file, indent=4)
+    return value
+
+def measure_clips(paths, workers=MEASURE_WORKERS):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(loudness, paths))
+
+def loudnorm_filter(measurement, tolerance=LOUDNESS_TOLERANCE):
+    # The second loudnorm pass fed with the cached measurement, linear so the clip only gets a constant gain.
+    # None when the clip needs no correction or is silent (loudnorm reports -inf for those).
+    if measurement is None or measurement["input_i"] == float("-inf"):
+        return None
+    if abs(measurement["input_i"] - LOUDNESS_TARGET) <= tolerance and measurement["input_tp"] <= TRUE_PEAK:
+        return None
+    return (
+        f'loudnorm=I={LOUDNESS_TARGET}:TP={TRUE_PEAK}:LRA={LOUDNESS_RANGE}'
+        f':measured_I={measurement["input_i"]}:measured_TP={measurement["input_tp"]}'
+        f':measured_LRA={measurement["input_lra"]}:measured_thresh={measurement["input_thresh"]}'
+        f':offset={measurement["target_offset"]}:linear=true'
+    )
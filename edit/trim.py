@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import time
+
+from lib.media import frame_count
+from lib.media_index import media_index
+from edit.ffmpeg import VIDEO_ENCODERS, INBAND_TAGS, ENCODE_PRESET, ENCODE_CRF, concat_copy, run_ffmpeg
+
+KEYFRAME_TOLERANCE = 0.1  # Seconds a cut point may be off a keyframe and still count as "on" it
+TRIM_MODES = ("auto", "copy", "smart", "reencode")
+
+
+def nearest_keyframe(keyframe_times, position):
+    if not keyframe_times:
+        return None
+    return min(keyframe_times, key=lambda keyframe: abs(keyframe - position))
+
+def on_keyframe(keyframe_times, position, duration):
+    # The very start and end of the file are always clean cut points
+    if position <= 0 or position >= duration:
+        return True
+    keyframe = nearest_keyframe(keyframe_times, position)
+    return keyframe is not None and abs(keyframe - position) <= KEYFRAME_TOLERANCE
+
+def trim_copy(input_path, output_path, start, end, keyframe_times):
+    # Snap the start onto its keyframe so the first frame is decodable
+    keyframe = nearest_keyframe(keyframe_times, start)
+    if start > 0 and keyframe is not None:
+        start = keyframe
+    run_ffmpeg(['ffmpeg', '-y', '-ss', str(start), '-i', input_path, '-t', str(end - start), '-c', 'copy', '-avoid_negative_ts', 'make_zero', output_path], "stream copy trim")
+    return start, end
+
+def trim_reencode(input_path, output_path, start, end, preset=ENCODE_PRESET, crf=ENCODE_CRF):
+    run_ffmpeg(['ffmpeg', '-y', '-ss', str(start), '-i', input_path, '-t', str(end - start), '-c:v', 'libx264', '-preset', preset, '-crf', str(crf), '-c:a', 'aac', output_path], "re-encode trim")
+    return start, end
+
+def encode_boundary(input_path, output_path, start, end, video, preset, crf):
+    # Re-encode one boundary GOP with the source parameters so it can be concatenated with copied packets
+    run_ffmpeg([
+        'ffmpeg', '-y', '-ss', str(start), '-i', input_path, '-t', str(end - start), '-an',
+        '-c:v', VIDEO_ENCODERS[video["codec"]], '-preset', preset, '-crf', str(crf),
+        '-pix_fmt', video["pix_fmt"], '-video_track_timescale', video["time_base"].split("/")[1],
+        output_path,
+    ], "re-encode a boundary GOP")
+
+def copy_window(start, end, info, keyframe_times):
+    # Keyframe-aligned section of the cut that can be stream copied, None if there is none
+    duration = info["duration"]
+    inner = [keyframe for keyframe in keyframe_times if start <= keyframe <= end]
+    if on_keyframe(keyframe_times, start, duration):
+        copy_start = nearest_keyframe(keyframe_times, start) if start > 0 else start
+    elif inner:
+        copy_start = inner[0]
+    else:
+        return None
+    if on_keyframe(keyframe_times, end, duration):
+        copy_end = end
+    elif inner:
+        copy_end = inner[-1]
+    else:
+        return None
+    if copy_end <= copy_start:
+        return None
+    return copy_start, copy_end
+
+def trim_smart(input_path, output_path, start, end, info, keyframe_times, preset=ENCODE_PRESET, crf=ENCODE_CRF):
+    copy_start, copy_end = copy_window(start, end, info, keyframe_times)
+    start = min(start, copy_start)
+
+    work_dir = tempfile.mkdtemp(prefix="trim_", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        parts = []
+        if copy_start > start:
+            head_path = os.path.join(work_dir, "head.mp4")
+            encode_boundary(input_path, head_path, start, copy_start, info["video"], preset, crf)
+            parts.append(head_path)
+
+        # A stream copy limited with -t stops on decode timestamps, with B-frames it would carry the next
+        # keyframe and its first P-frame along, which the re-encoded tail shows again. Counting frames cuts exactly.
+        middle_path = os.path.join(work_dir, "middle.mp4")
+        frames = frame_count(input_path, copy_start, copy_end)
+        limit = ['-frames:v', str(frames)] if frames else ['-t', str(copy_end - copy_start)]
+        run_ffmpeg(['ffmpeg', '-y', '-ss', str(copy_start), '-i', input_path, *limit, '-an', '-c:v', 'copy', '-avoid_negative_ts', 'make_zero', middle_path], "copy the middle section")
+        parts.append(middle_path)
+
+        if end > copy_end:
+            tail_path = os.path.join(work_dir, "tail.mp4")
+            encode_boundary(input_path, tail_path, copy_end, end, info["video"], preset, crf)
+            parts.append(tail_path)
+
+        video_path = os.path.join(work_dir, "video.mp4")
+        tag = concat_copy(parts, video_path, work_dir)
+
+        if info["audio"] is None:
+            shutil.move(video_path, output_path)
+        else:
+            # Audio packets are tiny, so the audio track is cut precisely with a plain stream copy
+            run_ffmpeg([
+                'ffmpeg', '-y', '-i', video_path, '-ss', str(start), '-t', str(end - start), '-i', input_path,
+                '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', *(['-tag:v', tag] if tag else []), output_path,
+            ], "mux the trimmed audio")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return start, end
+
+def choose_mode(start, end, info, keyframe_times):
+    video = info["video"]
+    if video is None or not keyframe_times:
+        return "reencode"
+    if on_keyframe(keyframe_times, start, info["duration"]) and on_keyframe(keyframe_times, end, info["duration"]):
+        return "copy"
+    # The re-encoded boundary GOPs bring their own SPS/PPS, only codecs that can carry them in-band qualify
+    if video["codec"] in INBAND_TAGS and copy_window(start, end, info, keyframe_times):
+        return "smart"
+    return "reencode"
+
+def trim(input_path, output_path, start, end, mode="auto", info=None, preset=ENCODE_PRESET, crf=ENCODE_CRF):
+    started = time.time()
+    if mode not in TRIM_MODES:
+        raise ValueError(f"Unknown trim mode '{mode}', expected one of {', '.join(TRIM_MODES)}")
+
+    info = info or media_index.info(input_path)
+    keyframe_times = media_index.keyframes(input_path)
+    if mode == "auto":
+        mode = choose_mode(start, end, info, keyframe_times)
+    elif mode == "smart" and choose_mode(start, end, info, keyframe_times) == "reencode":
+        mode = "reencode"  # No keyframe inside the cut, nothing can be copied
+
+    if mode == "copy":
+        start, end = trim_copy(input_path, output_path, start, end, keyframe_times)
+    elif mode == "smart":
+        start, end = trim_smart(input_path, output_path, start, end, info, keyframe_times, preset, crf)
+    else:
+        start, end = trim_reencode(input_path, output_path, start, end, preset, crf)
+
+    return {"path": output_path, "mode": mode, "start": start, "end": end, "seconds": round(time.time() - started, 2)}
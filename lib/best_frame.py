@@ -0,0 +1,101 @@
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from lib.media_index import media_index
+from lib.thumbnail import render_thumbnail
+
+SAMPLE_COUNT = 12
+SAMPLE_SIZE = (320, 180)  # Frames are scored at this size, ffmpeg scales them while decoding
+EDGE_MARGIN = 0.05  # Skip the first and last 5% of the clip, fades and title cards live there
+SAMPLE_WORKERS = 4
+SCORE_WEIGHTS = {"sharpness": 0.5, "exposure": 0.2, "colorfulness": 0.3}
+
+
+def sample_positions(duration, count=SAMPLE_COUNT):
+    start = duration * EDGE_MARGIN
+    end = duration * (1 - EDGE_MARGIN)
+    return list(np.linspace(start, end, count))
+
+def read_frame(video_path, position, size=SAMPLE_SIZE):
+    # Seek on the input and decode only keyframes, so each sample costs a single frame decode
+    width, height = size
+    command = [
+        'ffmpeg', '-v', 'error', '-skip_frame', 'nokey', '-ss', f'{position:.3f}', '-i', video_path,
+        '-frames:v', '1', '-vf', f'scale={width}:{height}', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-',
+    ]
+    result = subprocess.run(command, capture_output=True)
+    expected = width * height * 3
+    if result.returncode != 0 or len(result.stdout) < expected:
+        return None
+    return np.frombuffer(result.stdout[:expected], dtype=np.uint8).reshape(height, width, 3)
+
+def normalized(values):
+    peak = values.max()
+    return values / peak if peak > 0 else values
+
+def score_frames(frames):
+    # frames is an (N, H, W, 3) uint8 array, every metric is computed for all frames at once
+    rgb = frames.astype(np.float32)
+    red, green, blue = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    gray = 0.299 * red + 0.587 * green + 0.114 * blue
+
+    # Sharpness: variance of the Laplacian
+    laplacian = (
+        gray[:, :-2, 1:-1] + gray[:, 2:, 1:-1] + gray[:, 1:-1, :-2] + gray[:, 1:-1, 2:]
+        - 4 * gray[:, 1:-1, 1:-1]
+    )
+    sharpness = laplacian.var(axis=(1, 2))
+
+    # Exposure: 1 at mid gray, 0 for black or blown out frames
+    brightness = gray.mean(axis=(1, 2)) / 255
+    exposure = 1 - np.abs(brightness - 0.5) * 2
+
+    # Colorfulness (Hasler & Suesstrunk)
+    rg = red - green
+    yb = 0.5 * (red + green) - blue
+    colorfulness = (
+        np.sqrt(rg.std(axis=(1, 2)) ** 2 + yb.std(axis=(1, 2)) ** 2)
+        + 0.3 * np.sqrt(rg.mean(axis=(1, 2)) ** 2 + yb.mean(axis=(1, 2)) ** 2)
+    )
+
+    return (
+        SCORE_WEIGHTS["sharpness"] * normalized(sharpness)
+        + SCORE_WEIGHTS["exposure"] * exposure
+        + SCORE_WEIGHTS["colorfulness"] * normalized(colorfulness)
+    )
+
+def extract_best_thumbnail(video_path, output_path, samples=SAMPLE_COUNT):
+    info = media_index.info(video_path)
+    if info is None or info["video"] is None or info["duration"] <= 0:
+        return None
+
+    positions = sample_positions(info["duration"], samples)
+    with ThreadPoolExecutor(max_workers=SAMPLE_WORKERS) as pool:
+        frames = list(pool.map(lambda position: read_frame(video_path, position), positions))
+    candidates = [(position, frame) for position, frame in zip(positions, frames) if frame is not None]
+    if not candidates:
+        return None
+
+    scores = score_frames(np.stack([frame for position, frame in candidates]))
+    best_position = candidates[int(scores.argmax())][0]
+
+    # Grab the winning frame at full resolution and hand it to the regular 1280x720 thumbnail path
+    frame_path = f"{output_path}.frame.jpg"
+    command = [
+        'ffmpeg', '-v', 'error', '-y', '-skip_frame', 'nokey', '-ss', f'{best_position:.3f}', '-i', video_path,
+        '-frames:v', '1', '-q:v', '2', frame_path,
+    ]
+    result = subprocess.run(command)
+    try:
+        if result.returncode != 0 or not os.path.exists(frame_path):
+            return None
+        render_thumbnail(frame_path, output_path)
+    finally:
+        if os.path.exists(frame_path):
+            os.remove(frame_path)
+
+    print(f"Extracted a thumbnail from '{video_path}' at {best_position:.2f}s.")
+    return output_path
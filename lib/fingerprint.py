@@ -0,0 +1,149 @@
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from lib.media_index import media_index
+from lib.storage import atomic_write
+
+FINGERPRINT_PATH = "ASSETS/.fingerprints.npz"
+FRAME_COUNT = 8
+HASH_WIDTH = 9  # dHash compares neighbouring pixels, 9x8 gray gives 8x8 = 64 bits per frame
+HASH_HEIGHT = 8
+EDGE_MARGIN = 0.05  # Skip fades and title cards at both ends
+DUPLICATE_DISTANCE = 10  # Mean differing bits per frame up to which two clips count as the same scene
+FINGERPRINT_WORKERS = 4
+
+# Set bits per byte, for NumPy versions without bitwise_count
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def popcount(values):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    counts = POPCOUNT[values.view(np.uint8)].reshape(*values.shape, 8)
+    return counts.sum(axis=-1, dtype=np.uint8)
+
+def frame_hash(video_path, position):
+    # A single keyframe decode, ffmpeg scales it straight down to the 9x8 gray the hash needs
+    command = [
+        'ffmpeg', '-v', 'error', '-skip_frame', 'nokey', '-ss', f'{position:.3f}', '-i', video_path,
+        '-frames:v', '1', '-vf', f'scale={HASH_WIDTH}:{HASH_HEIGHT}', '-f', 'rawvideo', '-pix_fmt', 'gray', '-',
+    ]
+    result = subprocess.run(command, capture_output=True)
+    expected = HASH_WIDTH * HASH_HEIGHT
+    if result.returncode != 0 or len(result.stdout) < expected:
+        return None
+    pixels = np.frombuffer(result.stdout[:expected], dtype=np.uint8).reshape(HASH_HEIGHT, HASH_WIDTH)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return np.packbits(bits).view('>u8').astype(np.uint64)[0]
+
+def fingerprint(video_path, frames=FRAME_COUNT):
+    # frames hashes taken at the same relative positions in every clip, None if the clip cannot be read
+    info = media_index.info(video_path)
+    if info is None or info["video"] is None or info["duration"] <= 0:
+        return None
+    duration = info["duration"]
+    positions = np.linspace(duration * EDGE_MARGIN, duration * (1 - EDGE_MARGIN), frames)
+    hashes = [frame_hash(video_path, position) for position in positions]
+    if any(value is None for value in hashes):
+        return None
+    return np.array(hashes, dtype=np.uint64)
+
+def distances(hashes, query):
+    # hashes is (N, F), query (F,). Every query frame is matched with its closest frame of each clip, so
+    # exports trimmed a little differently still line up; the result is the mean of those bit distances.
+    if len(hashes) == 0:
+        return np.zeros(0)
+    bits = popcount(hashes[:, :, None] ^ query[None, None, :])
+    return bits.min(axis=1).mean(axis=1)
+
+
+# Fingerprints by file name, checked against size and mtime so a re-export is hashed again.
+# Entries stay after a clip leaves the folder, new clips are then also compared against what
+# was already scheduled or uploaded.
+class FingerprintIndex():
+    def __init__(self, path=FINGERPRINT_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = None  # name -> (size, mtime_ns, hashes), loaded on first use
+
+    def load(self):
+        if self.entries is None:
+            self.entries = {}
+            if os.path.exists(self.path):
+                with np.load(self.path) as data:
+                    for name, size, mtime_ns, hashes in zip(data["names"], data["sizes"], data["mtimes"], data["hashes"]):
+                        self.entries[str(name)] = (int(size), int(mtime_ns), hashes)
+        return self.entries
+
+    def save(self):
+        entries = self.load()
+        names = sorted(entries)
+        with atomic_write(self.path, 'wb') as file:
+            np.savez(
+                file,
+                names=np.array(names, dtype=str),
+                sizes=np.array([entries[name][0] for name in names], dtype=np.int64),
+                mtimes=np.array([entries[name][1] for name in names], dtype=np.int64),
+                hashes=np.array([entries[name][2] for name in names], dtype=np.uint64).reshape(len(names), FRAME_COUNT),
+            )
+
+    def update(self, folder, names, workers=FINGERPRINT_WORKERS):
+        # Hashes the clips that are new or changed, returns the names that could not be fingerprinted
+        with self.lock:
+            entries = self.load()
+            stale = []
+            for name in names:
+                stat = os.stat(os.path.join(folder, name))
+                entry = entries.get(name)
+                if entry is None or entry[:2] != (stat.st_size, stat.st_mtime_ns):
+                    stale.append((name, stat.st_size, stat.st_mtime_ns))
+
+        if not stale:
+            return []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            hashes = list(pool.map(lambda item: fingerprint(os.path.join(folder, item[0])), stale))
+
+        failed = []
+        with self.lock:
+            for (name, size, mtime_ns), value in zip(stale, hashes):
+                if value is None:
+                    failed.append(name)
+                else:
+                    self.entries[name] = (size, mtime_ns, value)
+            self.save()
+        print(f"Fingerprinted {len(stale) - len(failed)} clips, {len(failed)} could not be read.")
+        return failed
+
+    def hashes(self, names):
+        entries = self.load()
+        return {name: entries[name][2] for name in names if name in entries}
+
+    def known(self, exclude=()):
+        # Names and an (N, F) array of every fingerprint except the excluded names
+        entries = self.load()
+        names = [name for name in entries if name not in exclude]
+        return names, np.array([entries[name][2] for name in names], dtype=np.uint64).reshape(len(names), FRAME_COUNT)
+
+    def unique(self, candidates, exclude=(), threshold=DUPLICATE_DISTANCE):
+        # Walks candidates in order and keeps those that are not near a kept one or a known clip outside
+        # exclude, returns (kept, duplicates). Candidates without a fingerprint are kept.
+        names, known = self.known(exclude)
+        hashes = self.hashes(candidates)
+        kept_hashes = np.zeros((len(hashes), FRAME_COUNT), dtype=np.uint64)
+        filled = 0
+        kept = []
+        duplicates = []
+        for candidate in candidates:
+            value = hashes.get(candidate)
+            if value is not None:
+                if (distances(known, value) <= threshold).any() or (distances(kept_hashes[:filled], value) <= threshold).any():
+                    duplicates.append(candidate)
+                    continue
+                kept_hashes[filled] = value
+                filled += 1
+            kept.append(candidate)
+        return kept, duplicates
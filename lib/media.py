@@ -0,0 +1,71 @@
+import json
+import subprocess
+
+PROBE_VERSION = 2  # Bumped when probe() returns new fields, older cached results are probed again
+
+
+def run_ffprobe(args):
+    command = ['ffprobe', '-v', 'error', '-of', 'json', *args]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return json.loads(result.stdout)
+
+def probe(path):
+    data = run_ffprobe(['-show_format', '-show_streams', path])
+    if data is None:
+        return None
+
+    format_info = data.get("format", {})
+    info = {
+        "duration": float(format_info.get("duration", 0) or 0),
+        "format": format_info.get("format_name"),
+        "video": None,
+        "audio": None,
+        "version": PROBE_VERSION,
+    }
+
+    for stream in data.get("streams", []):
+        codec_type = stream.get("codec_type")
+        # Cover art shows up as a video stream, skip it
+        if codec_type == "video" and info["video"] is None and not stream.get("disposition", {}).get("attached_pic"):
+            info["video"] = {
+                "codec": stream.get("codec_name"),
+                "width": stream.get("width"),
+                "height": stream.get("height"),
+                "pix_fmt": stream.get("pix_fmt"),
+                "fps": stream.get("r_frame_rate"),
+                "time_base": stream.get("time_base"),
+                "profile": stream.get("profile"),
+                "level": stream.get("level"),
+            }
+        elif codec_type == "audio" and info["audio"] is None:
+            info["audio"] = {
+                "codec": stream.get("codec_name"),
+                "sample_rate": int(stream.get("sample_rate", 0) or 0),
+                "channels": stream.get("channels"),
+            }
+
+    return info
+
+def keyframes(path):
+    # Packet flags are enough to find keyframes, nothing has to be decoded
+    data = run_ffprobe(['-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags', path])
+    if data is None:
+        return []
+    return sorted(
+        float(packet["pts_time"])
+        for packet in data.get("packets", [])
+        if "K" in packet.get("flags", "") and packet.get("pts_time") not in (None, "N/A")
+    )
+
+def frame_count(path, start, end):
+    # Video frames presented in [start, end). Only the packet headers around that interval are read, a
+    # second past the end so B-frames that come after a later frame in decode order are still counted.
+    data = run_ffprobe(['-select_streams', 'v:0', '-read_intervals', f'{start}%{end + 1}', '-show_entries', 'packet=pts_time', path])
+    if data is None:
+        return None
+    return sum(
+        1 for packet in data.get("packets", [])
+        if packet.get("pts_time") not in (None, "N/A") and start <= float(packet["pts_time"]) < end
+    )
@@ -0,0 +1,80 @@
+import os
+import json
+
+from lib.media import PROBE_VERSION, probe, keyframes
+from lib.storage import Database
+
+MEDIA_INDEX_PATH = "ASSETS/.media_index.sqlite"
+
+
+class MediaIndex(Database):
+    def __init__(self, db_path=MEDIA_INDEX_PATH):
+        super().__init__(db_path)
+
+    def create_schema(self, connection):
+        # info / keyframes are NULL until computed, info is 'null' for files ffprobe cannot read
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS media ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "info TEXT, keyframes TEXT)"
+        )
+        connection.commit()
+
+    def stat_key(self, path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+    def lookup(self, path, column):
+        key = self.stat_key(path)
+        with self.lock:
+            row = self.connect().execute(
+                f"SELECT {column} FROM media WHERE path = ? AND size = ? AND mtime_ns = ?", key
+            ).fetchone()
+        return key, (row[0] if row else None)
+
+    def store(self, key, column, value):
+        path, size, mtime_ns = key
+        with self.lock:
+            connection = self.connect()
+            row = connection.execute("SELECT size, mtime_ns FROM media WHERE path = ?", (path,)).fetchone()
+            if row is None or tuple(row) != (size, mtime_ns):
+                # New or changed file, whatever else was cached for the path is stale
+                connection.execute(
+                    f"INSERT OR REPLACE INTO media (path, size, mtime_ns, {column}) VALUES (?, ?, ?, ?)",
+                    (path, size, mtime_ns, value),
+                )
+            else:
+                connection.execute(f"UPDATE media SET {column} = ? WHERE path = ?", (value, path))
+            connection.commit()
+
+    def info(self, path):
+        key, cached = self.lookup(path, "info")
+        if cached is not None:
+            value = json.loads(cached)
+            if value is None or value.get("version") == PROBE_VERSION:
+                return value
+        # Probe outside the lock so several threads can fill the index at once
+        value = probe(path)
+        self.store(key, "info", json.dumps(value))
+        return value
+
+    def keyframes(self, path):
+        key, cached = self.lookup(path, "keyframes")
+        if cached is not None:
+            return json.loads(cached)
+        value = keyframes(path)
+        self.store(key, "keyframes", json.dumps(value))
+        return value
+
+    def prune(self):
+        # Forget files that no longer exist
+        with self.lock:
+            connection = self.connect()
+            paths = [row[0] for row in connection.execute("SELECT path FROM media")]
+            missing = [(path,) for path in paths if not os.path.exists(path)]
+            connection.executemany("DELETE FROM media WHERE path = ?", missing)
+            connection.commit()
+        return len(missing)
+
+
+media_index = MediaIndex()
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from lib.storage import atomic_write
+
+METRICS_LOG = "ASSETS/metrics.jsonl"
+PROMETHEUS_FILE = "ASSETS/metrics.prom"  # Point the node_exporter textfile collector here
+METRICS_PREFIX = "automaton_"
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+# Counters, gauges and timings live in memory for the Prometheus view, every event is also appended
+# to a JSON-lines log so a nightly run can be reconstructed stage by stage afterwards
+class Metrics():
+    def __init__(self, log_path=METRICS_LOG, prometheus_path=PROMETHEUS_FILE):
+        self.log_path = log_path
+        self.prometheus_path = prometheus_path
+        self.run = datetime.now().strftime("%Y%m%d%H%M%S")
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.timings = {}  # key -> [count, total seconds]
+
+    def record(self, event, **fields):
+        line = json.dumps({"time": datetime.now().isoformat(timespec="milliseconds"), "run": self.run, "event": event, **fields})
+        with self.lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            with open(self.log_path, 'a', encoding='utf-8') as file:
+                file.write(line + "\n")
+
+    def count(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            timing = self.timings.setdefault(key, [0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+
+    @contextmanager
+    def timer(self, name, **labels):
+        # The yielded dict collects extra fields for the log line, e.g. bytes written
+        fields = {}
+        started = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            seconds = time.perf_counter() - started
+            self.observe(name, seconds, **labels)
+            self.record(name, seconds=round(seconds, 3), **labels, **fields)
+
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({name for name, labels in values}):
+                    lines.append(f"# TYPE {METRICS_PREFIX}{name} {kind}")
+                    for (key_name, labels), value in sorted(values.items()):
+                        if key_name == name:
+                            lines.append(f"{METRICS_PREFIX}{name}{label_text(labels)} {value}")
+            for name in sorted({name for name, labels in self.timings}):
+                lines.append(f"# TYPE {METRICS_PREFIX}{name} summary")
+                for (key_name, labels), (count, total) in sorted(self.timings.items()):
+                    if key_name == name:
+                        lines.append(f"{METRICS_PREFIX}{name}_count{label_text(labels)} {count}")
+                        lines.append(f"{METRICS_PREFIX}{name}_sum{label_text(labels)} {total:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        path = path or self.prometheus_path
+        with atomic_write(path) as file:
+            file.write(self.prometheus_text())
+        return path
+
+    def serve(self, port, host="0.0.0.0"):
+        # http.server is only imported when somebody asks for the endpoint
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+metrics = Metrics()
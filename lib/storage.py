@@ -0,0 +1,40 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode='w', encoding='utf-8'):
+    # Written next to the target and swapped in, so readers never see half a file and a crash leaves the
+    # previous version in place. The temporary name is per thread, two writers of one path never share it.
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, encoding=None if 'b' in mode else encoding) as file:
+            yield file
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# A SQLite file shared by the threads of the process. The connection is opened on first use, callers hold
+# self.lock around every statement. WAL lets other processes read while a run writes.
+class Database():
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.connection = None  # Opened on first use
+
+    def connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.create_schema(connection)
+            self.connection = connection
+        return self.connection
+
+    def create_schema(self, connection):
+        pass
@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from lib.storage import atomic_write
+
+THUMBNAIL_SIZE = (1280, 720)
+THUMBNAIL_VERSION = 1  # Bump whenever the template changes so every cached thumbnail is rebuilt
+THUMBNAIL_WORKERS = os.cpu_count() or 1
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+MANIFEST_FILE = ".thumbnails.json"
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_key(source_hash, size):
+    return f"{source_hash}:{size[0]}x{size[1]}:v{THUMBNAIL_VERSION}"
+
+def crop_to_aspect(img, aspect_ratio):
+    # Crop the image to the target aspect ratio around its center
+    width, height = img.size
+    if width / height > aspect_ratio:
+        # Crop horizontally
+        new_width = int(height * aspect_ratio)
+        left = (width - new_width) // 2
+        return img.crop((left, 0, left + new_width, height))
+    # Crop vertically
+    new_height = int(width / aspect_ratio)
+    top = (height - new_height) // 2
+    return img.crop((0, top, width, top + new_height))
+
+def render_thumbnail(src_path, dst_path, size=THUMBNAIL_SIZE):
+    with Image.open(src_path) as img:
+        # Let the JPEG decoder scale down by 1/2, 1/4 or 1/8 while loading, still covering the target size
+        img.draft('RGB', size)
+        img = img.convert('RGB')
+        img = crop_to_aspect(img, size[0] / size[1])
+        # reducing_gap does a cheap integer reduce() before the final LANCZOS pass
+        img = img.resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+        with atomic_write(dst_path, 'wb') as file:
+            img.save(file, format='JPEG')
+
+def thumbnail_job(src_path, dst_path, size, cached_key):
+    key = cache_key(file_hash(src_path), size)
+    if key == cached_key and os.path.exists(dst_path):
+        return dst_path, key, "cached"
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    render_thumbnail(src_path, dst_path, size)
+    return dst_path, key, "rendered"
+
+def find_images(source_dir):
+    images = []
+    for root, dirs, files in os.walk(source_dir):
+        for file in files:
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                images.append(os.path.join(root, file))
+    return sorted(images)
+
+def process_thumbnails(source_dir, output_dir, size=THUMBNAIL_SIZE, workers=THUMBNAIL_WORKERS):
+    # Outputs mirror the source tree, the manifest remembers which source content each one was built from
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+
+    jobs = []
+    for src_path in find_images(source_dir):
+        relative_path = os.path.splitext(os.path.relpath(src_path, source_dir))[0] + ".jpg"
+        jobs.append((src_path, os.path.join(output_dir, relative_path), relative_path))
+
+    counts = {"rendered": 0, "cached": 0, "failed": 0}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            (relative_path, pool.submit(thumbnail_job, src_path, dst_path, size, manifest.get(relative_path)))
+            for src_path, dst_path, relative_path in jobs
+        ]
+        for relative_path, future in futures:
+            try:
+                dst_path, key, status = future.result()
+            except Exception as e:
+                print(f"Thumbnail for '{relative_path}' failed: {e}")
+                counts["failed"] += 1
+                continue
+            manifest[relative_path] = key
+            counts[status] += 1
+
+    with atomic_write(manifest_path) as file:
+        json.dump(manifest, file, indent=4)
+
+    return counts
@@ -1,8 +1,14 @@
 import os
 import re
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.storage import atomic_write
 
 MAX_FILENAME_LENGTH = 75
-MAX_JSON_SIZE = 400 * 1024  # 400 KB in bytes
+SANITIZE_MANIFEST = ".sanitized.json"
+SANITIZE_WORKERS = 16  # Mostly waiting on stat() and small reads, so more threads than cores pays off
+HEADER_BYTES = 64
 
 def sanitize_filename(filename):
     # Replace problematic characters with underscores
@@ -12,47 +18,102 @@ def sanitize_filename(filename):
         sanitized_name = sanitized_name[:MAX_FILENAME_LENGTH]
     return sanitized_name
 
-def sanitize_files(topic_dir):
-    print("in sanitize")
-    # Iterate over all files in the topic directory
+def detect_extension(file_path):
+    # Trust the first bytes of the file over its name
+    with open(file_path, 'rb') as file:
+        header = file.read(HEADER_BYTES)
+    if header[4:8] == b'ftyp':
+        return ".mp4"
+    if header.startswith(b'\xff\xd8\xff'):
+        return ".jpg"
+    if header.startswith(b'\x89PNG'):
+        return ".png"
+    if header.lstrip(b'\xef\xbb\xbf \t\r\n')[:1] in (b'{', b'['):
+        return ".json"
+    return None
+
+def split_extension(file):
+    # "Mr. Smith goes to Washington" has no extension, only short alphanumeric suffixes count
+    stem, extension = os.path.splitext(file)
+    if re.fullmatch(r'\.[A-Za-z0-9]{1,5}', extension):
+        return stem, extension
+    return file, ""
+
+def sanitized_name(file_path, file):
+    stem, extension = split_extension(file)
+    extension = detect_extension(file_path) or extension
+    # Remove any existing occurrences of ".json" or ".mp4"
+    stem = re.sub(r'\.json*|\.mp4*', '', sanitize_filename(stem))
+    return stem + extension
+
+def check_file(root, file, known):
+    # Runs in the pool, on network filesystems the stat and header read are the slow part
+    file_path = os.path.join(root, file)
+    stat = os.stat(file_path)
+    key = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+    if known == key:
+        return root, file, key, None
+    return root, file, key, sanitized_name(file_path, file)
+
+def unique_name(name, taken):
+    stem, extension = split_extension(name)
+    candidate = name
+    suffix = 1
+    while candidate in taken:
+        candidate = f"{stem}_{suffix}{extension}"
+        suffix += 1
+    return candidate
+
+def sanitize_files(topic_dir, workers=SANITIZE_WORKERS):
+    # The manifest remembers size, mtime and inode of every file already sanitized, unchanged files are skipped
+    manifest_path = os.path.join(topic_dir, SANITIZE_MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+
+    listings = {}
+    jobs = []
     for root, dirs, files in os.walk(topic_dir):
+        files = [file for file in files if not file.startswith(SANITIZE_MANIFEST)]
+        listings[root] = files
         for file in files:
-            file_path = os.path.join(root, file)
-            print(file_path)
-            # Check if the file has an extension
-            if '.' not in file:
-                # Get the size of the file
-                file_size = os.path.getsize(file_path)
-                # Assign extension based on file size
-                if file_size > MAX_JSON_SIZE:
-                    file_extension = ".mp4"
-                else:
-                    file_extension = ".json"
-            else:
-                # Use regular expressions to match ".m" or ".j" followed by any characters
-                match = re.search(r'\.(m|j)([^.]+)?$', file)
-                if match:
-                    if match.group(1) == "m":
-                        file_extension = ".mp4"
-                    elif match.group(1) == "j":
-                        file_extension = ".json"
-                else:
-                    # If no match is found, keep the original extension
-                    file_extension = os.path.splitext(file)[1]
-
-            # Get the sanitized filename
-            sanitized_filename = sanitize_filename(file)
-            # Remove any existing occurrences of ".json" or ".mp4"
-            sanitized_filename = re.sub(r'\.json*|\.mp4*', '', sanitized_filename)
-            # Construct the new file path with the sanitized filename and new extension
-            new_file_path = os.path.join(root, sanitized_filename + file_extension)
-            # Check if the sanitized filename already exists
-            if os.path.exists(new_file_path):
-                # print(f"File '{file}' already exists with sanitized filename '{sanitized_filename}'. Skipping.")
-                continue  # Skip over this file and move to the next one
-            # Rename the file
-            os.rename(file_path, new_file_path)
-            print(f"File '{file}' sanitized to '{sanitized_filename + file_extension}'")
+            jobs.append((root, file, manifest.get(os.path.relpath(os.path.join(root, file), topic_dir))))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda job: check_file(*job), jobs))
+
+    # Plan every rename up front. Targets never reuse a name present in the directory, so the order
+    # of the renames does not matter and nothing gets overwritten or silently skipped.
+    taken = {root: set(files) for root, files in listings.items()}
+    renames = []
+    updated = {}
+    counts = {"renamed": 0, "clean": 0, "cached": 0}
+    for root, file, key, new_name in results:
+        if new_name is None:
+            counts["cached"] += 1
+        elif new_name == file:
+            counts["clean"] += 1
+        else:
+            new_name = unique_name(new_name, taken[root])
+            taken[root].add(new_name)
+            renames.append((root, file, new_name, key))
+            continue
+        updated[os.path.relpath(os.path.join(root, file), topic_dir)] = key
+
+    for root, file, new_name, key in renames:
+        os.rename(os.path.join(root, file), os.path.join(root, new_name))
+        print(f"File '{file}' sanitized to '{new_name}'")
+        # A rename keeps size, mtime and inode
+        updated[os.path.relpath(os.path.join(root, new_name), topic_dir)] = key
+        counts["renamed"] += 1
+
+    # Rebuilt from this walk, so deleted files drop out of the manifest
+    with atomic_write(manifest_path) as file:
+        json.dump(updated, file)
+
+    print(f"Sanitized '{topic_dir}': {counts['renamed']} renamed, {counts['clean']} already clean, {counts['cached']} unchanged since last run.")
+    return counts
 
 # Example usage:
 # topic_directory = "/path/to/your/topic/directory"
@@ -1,73 +1,53 @@
 import os
 import re
-import requests
+import sys
 import subprocess
 from datetime import datetime
 import shutil
-import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from moviepy.editor import VideoFileClip
-from lib.utility import sanitize_files, sanitize_filename
-from pytube import YouTube
-from pytube.innertube import _default_clients
-from upload.upload_video import YouTubeUploader
+from commands import find_command
+from lib.utility import sanitize_filename
+from download.cache import SegmentCache
+from download.captions import download_srt, find_caption_track
 
 from dotenv import load_dotenv
 load_dotenv('.env.local') # Load environment variables from .env file
 
 
-from PIL import Image
-from moviepy.editor import VideoFileClip, concatenate_videoclips
-from moviepy.video.fx.all import resize
+from edit.concat import assemble as assemble_clips
+from edit.encode import ENCODE_WORKERS
+from edit.ffmpeg import DEFAULT_RESOLUTION, ENCODE_PRESET, ENCODE_CRF, RESOLUTIONS
+from edit.trim import trim as trim_clip
+from lib.media_index import media_index
+from lib.metrics import metrics
 
-# Upload
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+# pytube, requests, PIL and the Google API clients are imported inside the functions that need them,
+# the REPL prompt should not wait for libraries the chosen command never uses
 
+DOWNLOAD_WORKERS = 4  # Parallel downloads in batch mode
+CLIPS_PER_ASSEMBLY = 3  # Clip folders needed before an assembly is triggered
 
-_default_clients["ANDROID_MUSIC"] = _default_clients["ANDROID_CREATOR"]
+OUTRO_PATH = "ASSETS/OUTRO/OUTRO-001.mp4"
+
+segment_cache = SegmentCache()
 
 # Set up YouTube Data API service
 def get_youtube_service():
-    # Load client secrets from file
-    flow = InstalledAppFlow.from_client_secrets_file(
-        'client_secrets.json', scopes=['https://www.googleapis.com/auth/youtube.force-ssl'])
-    creds = flow.run_local_server(port=0)
-
-    # Save the credentials for later use
-    with open('token.pickle', 'wb') as token:
-        pickle.dump(creds, token)
+    from upload.service_pool import get_data_service
+    # Reuses the cached credentials from token.pickle and refreshes them ahead of expiry
+    return get_data_service('client_secrets.json', ['https://www.googleapis.com/auth/youtube.force-ssl'])
 
-    # Build the YouTube Data API service
-    youtube = build('youtube', 'v3', credentials=creds)
-    return youtube
-
-# Retrieve English captions for the video
+# Retrieve English captions for the video, the captions command fetches and indexes many videos at once
 def get_english_captions(video_id):
-    youtube = get_youtube_service()
-    request = youtube.captions().list(
-        part='snippet',
-        videoId=video_id
-    )
-    response = request.execute()
-    for item in response['items']:
-        if item['snippet']['language'] == 'en':
-            return item['id']
-    return None
+    return find_caption_track(get_youtube_service(), video_id, 'en')
 
 # Download captions as SRT file
 def download_captions(video_id, captions_id, output_path):
     if captions_id:
-        youtube = get_youtube_service()
-        request = youtube.captions().download(
-            id=captions_id,
-            tfmt='srt'
-        )
-        response = request.execute()
-        with open(output_path, 'wb') as f:
-            f.write(response)
+        download_srt(get_youtube_service(), captions_id, output_path)
         print("Downloaded captions:", output_path)
     else:
         print("No English captions found for this video.")
@@ -85,43 +65,26 @@ def crop_image(image_path):
     # Construct the absolute path to the image
     abs_image_path = os.path.join(script_dir, image_path)
     
-    # Open the image
-    img = Image.open(abs_image_path)
-    
-    # Crop the image to 16:9 aspect ratio
-    width, height = img.size
-    aspect_ratio = 16 / 9
-    if width / height > aspect_ratio:
-        # Crop horizontally
-        new_width = int(height * aspect_ratio)
-        left = (width - new_width) / 2
-        right = left + new_width
-        img = img.crop((left, 0, right, height))
-    else:
-        # Crop vertically
-        new_height = int(width / aspect_ratio)
-        top = (height - new_height) / 2
-        bottom = top + new_height
-        img = img.crop((0, top, width, bottom))
-    
-    # Resize the cropped image to 1280x720
-    img = img.resize((1280, 720), Image.ANTIALIAS)
-    
-    # Save the scaled image
-    img.save(abs_image_path, format='JPEG')
-
-def trim_video(input_path, trim_start=0, trim_end=None):
-    # Load the video clip
-    video_clip = VideoFileClip(input_path)
+    # Crop to 16:9, scale to 1280x720 and atomically replace the image
+    from lib.thumbnail import render_thumbnail
+    render_thumbnail(abs_image_path, abs_image_path)
+
+def trim_video(input_path, trim_start=0, trim_end=None, mode="auto"):
+    # Look the container up in the media index instead of opening a full decoder just for the duration.
+    # The index keys entries by stat(), a missing file is reported like an unreadable one.
+    info = media_index.info(input_path) if os.path.exists(input_path) else None
+    if info is None:
+        print(f"Error: Could not read '{input_path}'.")
+        return
 
     # Define the duration of the video as a float
-    duration = float(video_clip.duration)
+    duration = float(info["duration"])
 
     # Set default trim_end to the end of the video
     if trim_end is None:
         trim_end = duration
     else:
-        trim_end = duration - trim_end
+        trim_end = duration - float(trim_end)
         
 
     # Ensure trim_start and trim_end are within the duration of the video
@@ -133,57 +96,116 @@ def trim_video(input_path, trim_start=0, trim_end=None):
         print("Error: Invalid trim parameters. Trim end time should be greater than trim start time.")
         return
 
-    # Trim the video clip
-    trimmed_clip = video_clip.subclip(trim_start, trim_end)
-
     # Define the output path for the trimmed video
     output_path = input_path.replace(".mp4", "_trimmed.mp4")
 
-    # Write the trimmed clip to the output file
-    trimmed_clip.write_videofile(output_path)
-
-    # Close the video clips
-    video_clip.close()
-    trimmed_clip.close()
+    # Stream copy when the cut points sit on keyframes, otherwise only re-encode the boundary GOPs
+    result = trim_clip(input_path, output_path, trim_start, trim_end, mode, info)
+    print(f"Trimmed '{input_path}' to {result['start']:.2f}-{result['end']:.2f}s (mode={result['mode']}, {result['seconds']}s)")
 
     # Optionally, you may delete or rename the original video file here
 
     return output_path
 
-def download_from_yt(url, start_time=0, end_time=0, output_dir="ASSETS/CLIPS",):
+def resolve_video(url):
+    from pytube import YouTube
+    from pytube.innertube import _default_clients
+    _default_clients["ANDROID_MUSIC"] = _default_clients["ANDROID_CREATOR"]
+    with metrics.timer("pytube_resolve_seconds") as fields:
+        yt = YouTube(url, use_oauth=True, allow_oauth_cache=True)
+        stream = yt.streams.get_highest_resolution()
+        fields["url"] = url
+    return yt, stream
+
+def download_segments_from_yt(url, windows, output_dir="ASSETS/CLIPS"):
     os.makedirs(output_dir, exist_ok=True)
-    yt = YouTube(url, use_oauth=True, allow_oauth_cache=True)
-    title = sanitize_filename(yt.title)
-    output_path = os.path.join(output_dir, title)
-    os.makedirs(output_path, exist_ok=True)
 
-    stream = yt.streams.get_highest_resolution()
-    output_file_path = os.path.join(output_path, f'{title}.mp4')
+    # A video that is already in the segment cache skips the pytube resolution
+    video_id = extract_video_id(url)
+    video = segment_cache.get_video(video_id) if video_id else None
+    yt = stream = None
+    if video:
+        title = video["title"]
+        itag = video["itag"]
+        duration = video["length"]
+    else:
+        yt, stream = resolve_video(url)
+        title = sanitize_filename(yt.title)
+        itag = stream.itag
+        duration = yt.length
+
+    # Every window becomes its own clip folder, numbered when one source yields several clips
+    clips = []
+    for i, (start_time, end_time) in enumerate(windows):
+        # Set start_time to 0 if it is None
+        start_time = 0 if start_time is None else start_time
+        # If end_time is None, set it to the duration of the video
+        if end_time is None:
+            end_time = duration
+
+        name = title if len(windows) == 1 else f"{title}_{i + 1}"
+        output_path = os.path.join(output_dir, name)
+        os.makedirs(output_path, exist_ok=True)
+        clips.append((start_time, end_time, output_path, os.path.join(output_path, f'{name}.mp4')))
+
+    missing = [clip for clip in clips if not (video and segment_cache.fetch(video_id, itag, clip[0], clip[1], clip[3]))]
+    metrics.count("segment_cache_hits_total", len(clips) - len(missing))
+    if missing:
+        if stream is None:
+            yt, stream = resolve_video(url)
+        # One ffmpeg session for all windows, each input seeks straight to its own range. The clips are
+        # written next to their final path and only moved into place once ffmpeg finished cleanly.
+        command = ['ffmpeg', '-y']
+        for start_time, end_time, output_path, output_file_path in missing:
+            command += ['-ss', str(start_time), '-t', str(end_time - start_time), '-i', stream.url]
+        for i, (start_time, end_time, output_path, output_file_path) in enumerate(missing):
+            command += ['-map', str(i), '-c:v', 'copy', '-c:a', 'copy', '-f', 'mp4', f"{output_file_path}.part"]
+        with metrics.timer("ffmpeg_fetch_seconds") as fields:
+            result = subprocess.run(command)
+            fetched = sum(os.path.getsize(f"{clip[3]}.part") for clip in missing if os.path.exists(f"{clip[3]}.part"))
+            fields.update(url=url, windows=len(missing), bytes=fetched, returncode=result.returncode)
+        metrics.count("ffmpeg_fetch_bytes_total", fetched)
+        if result.returncode != 0:
+            # A fetch that died halfway must never reach the clip folders or the segment cache
+            for clip in missing:
+                if os.path.exists(f"{clip[3]}.part"):
+                    os.remove(f"{clip[3]}.part")
+            raise RuntimeError(f"ffmpeg failed to fetch {len(missing)} windows of '{url}'")
+        for start_time, end_time, output_path, output_file_path in missing:
+            os.replace(f"{output_file_path}.part", output_file_path)
+            if video_id:
+                segment_cache.store(video_id, stream.itag, start_time, end_time, output_file_path)
 
-    # Set start_time to 0 if it is None
-    start_time = 0 if start_time is None else start_time
+    thumbnail_filename = "thumbnail.jpg"
+    thumbnail_path = os.path.join(clips[0][2], thumbnail_filename)
+    cached_thumbnail = segment_cache.thumbnail_path(video_id) if video else None
+    if cached_thumbnail and yt is None:
+        shutil.copyfile(cached_thumbnail, thumbnail_path)
+    else:
+        if yt is None:
+            yt, stream = resolve_video(url)
+        import requests
+        thumbnail = requests.get(yt.thumbnail_url).content
+        with open(thumbnail_path, 'wb') as thumbnail_file:
+            thumbnail_file.write(thumbnail)
+        if video_id:
+            segment_cache.put_video(video_id, title, stream.itag, yt.length, thumbnail)
+    crop_image(thumbnail_path)
+    for start_time, end_time, output_path, output_file_path in clips[1:]:
+        shutil.copyfile(thumbnail_path, os.path.join(output_path, thumbnail_filename))
 
-    # Get the duration of the video in seconds
-    duration = yt.length
+    return [output_file_path for start_time, end_time, output_path, output_file_path in clips]
 
-    # If end_time is None, set it to the duration of the video
-    print(end_time)
-    if end_time is None:
-        end_time = duration
+def download_from_yt(url, start_time=0, end_time=0, output_dir="ASSETS/CLIPS", interactive=True):
+    output_file_path = download_segments_from_yt(url, [(start_time, end_time)], output_dir)[0]
 
-    command = ['ffmpeg', '-ss', str(start_time), '-i', stream.url, '-t', str(end_time - start_time), '-c:v', 'copy', '-c:a', 'copy', output_file_path]
-    subprocess.run(command)
+    # Batch downloads never stop for the upload prompt
+    if interactive:
+        prompt_upload(output_file_path)
 
-    thumbnail_url = yt.thumbnail_url
-    thumbnail_filename = "thumbnail.jpg"
-    thumbnail_path = os.path.join(output_path, thumbnail_filename)
-    with open(thumbnail_path, 'wb') as thumbnail_file:
-        thumbnail_file.write(requests.get(thumbnail_url).content)
-    crop_image(thumbnail_path)
+    return output_file_path
 
-    # Prompt the user if they want to upload the file
-    upload_choice = input("Do you want to upload this file? (y/n): ").lower()
-    
+def prompt_upload(output_file_path):
     while True:
         # Prompt the user if they want to upload the file
         upload_choice = input("Do you want to upload this file? (y/n): ").lower()
@@ -197,8 +219,6 @@ def download_from_yt(url, start_time=0, end_time=0, output_dir="ASSETS/CLIPS",):
         else:
             print("Invalid choice. Please enter 'y' or 'n'.")
 
-
-
     # Check if video ID is extracted successfully
     # print("going to download the captions")
     # if video_id:
@@ -211,6 +231,7 @@ def download_from_yt(url, start_time=0, end_time=0, output_dir="ASSETS/CLIPS",):
 def upload_to_youtube(video_path, title='', description='', tags='', category='', privacy_status='', scheduleDateTime=''):
 
     # Initialize YouTubeUploader
+    from upload.upload_video import ThumbnailQuotaExceeded, UploadFailed, YouTubeUploader
     uploader = YouTubeUploader("client_secrets.json")
 
     # Construct options dictionary
@@ -249,70 +270,67 @@ def upload_to_youtube(video_path, title='', description='', tags='', category=''
     # Upload the video
     # print(options)
     print("Uploading video...")
-    uploader.initialize_upload(options)
+    try:
+        uploader.initialize_upload(options)
+    except UploadFailed as e:
+        print(f"Error: {e}")
+        return
+    except ThumbnailQuotaExceeded as e:
+        print(str(e))
     print("Video uploaded successfully.")
 
-def assemble_video(topic, id): 
+def assemble_video(topic, id, interactive=True, workers=ENCODE_WORKERS, preset=ENCODE_PRESET, crf=ENCODE_CRF, reencode=False, profile=DEFAULT_RESOLUTION):
     # Get video clips from each folder
     clips = []
-    for i in range(1, 4):  # Assuming 3 folders
-        folder_path = f"ASSETS/VIDEOS/{topic}/{id}/{i}"
+    # One numbered folder per clip, 3 from the download command but manifests may bring more
+    id_folder = f"ASSETS/VIDEOS/{topic}/{id}"
+    for i in sorted((name for name in os.listdir(id_folder) if name.isdigit()), key=int):
+        folder_path = f"{id_folder}/{i}"
         # Assuming random_file_names are all .mp4
         video_files = os.listdir(folder_path)
         for video_file in video_files:
             if video_file.endswith(".mp4"):
-                clip = VideoFileClip(os.path.join(folder_path, video_file))
-                # Resize the clip to 1920x1080
-                clip = clip.resize((1920, 1080))
-                clips.append(clip)
-    
-    # Add outro
-    outro_clip = VideoFileClip("ASSETS/OUTRO/OUTRO-001.mp4")
-    # Resize the outro clip to 1920x1080
-    outro_clip = outro_clip.resize((1920, 1080))
-    # Concatenate video clips  
-    final_clip = concatenate_videoclips([*clips, outro_clip], method="compose")
-    
-    # Write final video
+                clips.append(os.path.join(folder_path, video_file))
+
+    # Add outro, the clips that already match it are stream copied, the rest re-encoded to the profile's resolution
     output_path = f"ASSETS/VIDEOS/{topic}/{id}/{topic}_{id}.mp4"
-    final_clip.write_videofile(output_path, fps=24)
+    width, height = RESOLUTIONS[profile]
+    started = time.time()
+    with metrics.timer("assemble_seconds", topic=topic, profile=profile) as fields:
+        result = assemble_clips([*clips, OUTRO_PATH], output_path, width, height, preset, crf, workers, reencode)
+        fields.update(id=id, copied=result["copied"], reencoded=result["reencoded"], loudness=result["loudness"])
+    print(
+        f"Assembled {output_path} ({result['copied']} copied, {result['reencoded']} re-encoded, "
+        f"{result['loudness']} loudness corrected, {time.time() - started:.1f}s)"
+    )
 
-    while True:
-        # Prompt the user if they want to upload the file
-        upload_choice = input("Do you want to upload this file? (y/n): ").lower()
+    if interactive:
+        prompt_upload(output_path)
 
-        if upload_choice == 'y':
-            upload_to_youtube(output_path)
-            break  # Exit the loop if 'y' is entered
-        elif upload_choice == 'n':
-            print("File not uploaded.")
-            break  # Exit the loop if 'n' is entered
-        else:
-            print("Invalid choice. Please enter 'y' or 'n'.")
+    return output_path
+
+def parse_time_windows(param):
+    # "...&start=1:00&end=1:30&start=5:00&end=5:20" yields one window per start/end pair
+    windows = re.findall(r'&start=([\d:]+)&end=([\d:]+)', param)
+    return [(time_to_seconds(start), time_to_seconds(end)) for start, end in windows]
 
 def parse_time_param(param):
-    print(param)
-    start_index = param.find("&start=")
-    end_index = param.find("&end=")
-    print(end_index)
-    if start_index != -1 and end_index != -1:
-        start_time_str = param[start_index + len("&start="):end_index]
-        end_time_str = param[end_index + len("&end="):]
-        
-        start_time_secs = time_to_seconds(start_time_str)
-        end_time_secs = time_to_seconds(end_time_str)
-        
-        return start_time_secs, end_time_secs
-    else:
-        return None, None
+    windows = parse_time_windows(param)
+    return windows[0] if windows else (None, None)
 
 def time_to_seconds(time_str):
     minutes, seconds = map(int, time_str.split(":"))
     return minutes * 60 + seconds
 
-def assemble_videos(topic, assembly_folder):
+def collect_assembly(topic, assembly_folder):
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     new_folder_path = os.path.join("ASSETS/VIDEOS", topic, timestamp)
+    # Batch mode can collect twice within the same second
+    suffix = 1
+    while os.path.exists(new_folder_path):
+        new_folder_path = os.path.join("ASSETS/VIDEOS", topic, f"{timestamp}_{suffix}")
+        suffix += 1
+    timestamp = os.path.basename(new_folder_path)
     os.makedirs(new_folder_path, exist_ok=True)
 
     for i, folder_name in enumerate(sorted(os.listdir(assembly_folder))):
@@ -336,152 +354,105 @@ def assemble_videos(topic, assembly_folder):
         
         os.rmdir(src_folder)  # Remove the old folder
 
-    assemble_video(topic, timestamp)
+    return timestamp
+
+def assemble_videos(topic, assembly_folder, interactive=True, workers=ENCODE_WORKERS, preset=ENCODE_PRESET, crf=ENCODE_CRF, reencode=False, profile=DEFAULT_RESOLUTION):
+    timestamp = collect_assembly(topic, assembly_folder)
+    return assemble_video(topic, timestamp, interactive, workers, preset, crf, reencode, profile)
+
+def move_clip_folder(output_file_path, assembly_folder, suffix):
+    # Sources with the same title download into folders with the same name, the later one gets a suffix.
+    # Callers that move clips from several threads hold a lock around this.
+    clip_folder = os.path.dirname(output_file_path)
+    base_folder = os.path.join(assembly_folder, os.path.basename(clip_folder))
+    dst_folder = base_folder
+    attempt = 1
+    while os.path.exists(dst_folder):
+        dst_folder = f"{base_folder}_{suffix}" if attempt == 1 else f"{base_folder}_{suffix}_{attempt}"
+        attempt += 1
+    shutil.move(clip_folder, dst_folder)
+    return os.path.join(dst_folder, os.path.basename(output_file_path))
+
+def download_batch(urls, windows, output_dir, topic=None, max_workers=DOWNLOAD_WORKERS):
+    assembly_folder = os.path.abspath(os.path.join(output_dir, "assembly"))
+    staging_folder = os.path.abspath(os.path.join(output_dir, "staging"))
+    os.makedirs(assembly_folder, exist_ok=True)
+
+    # Guards moving finished clips into the assembly folder and collecting them
+    lock = threading.Lock()
+    results = [None] * len(urls)
+    assemblies = []
+
+    def on_assembled(future, timestamp):
+        try:
+            assemblies.append({"id": timestamp, "status": "ok", "path": future.result(), "error": None})
+        except Exception as e:
+            assemblies.append({"id": timestamp, "status": "failed", "path": None, "error": str(e)})
+
+    def download_job(i):
+        started = time.time()
+        result = {"url": urls[i], "status": "ok", "paths": [], "assemblies": [], "error": None}
+        # Each job downloads into its own staging folder so assembly never sees partial clips
+        job_folder = os.path.join(staging_folder, str(i))
+        try:
+            output_file_paths = download_segments_from_yt(urls[i], windows[i], job_folder)
+
+            for output_file_path in output_file_paths:
+                with lock:
+                    moved_path = move_clip_folder(output_file_path, assembly_folder, i)
+
+                    num_folders = len([name for name in os.listdir(assembly_folder) if os.path.isdir(os.path.join(assembly_folder, name))])
+                    if topic and num_folders >= CLIPS_PER_ASSEMBLY:
+                        # The clip now lives in the assembly id folder
+                        timestamp = collect_assembly(topic, assembly_folder)
+                        result["assemblies"].append(timestamp)
+                        future = assembler.submit(assemble_video, topic, timestamp, False)
+                        future.add_done_callback(lambda f, timestamp=timestamp: on_assembled(f, timestamp))
+                    else:
+                        result["paths"].append(moved_path)
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = str(e)
+        finally:
+            shutil.rmtree(job_folder, ignore_errors=True)
+
+        result["seconds"] = round(time.time() - started, 2)
+        results[i] = result
+
+    # Assemblies run one at a time next to the downloads
+    with ThreadPoolExecutor(max_workers=1) as assembler:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(download_job, range(len(urls))))
+
+    shutil.rmtree(staging_folder, ignore_errors=True)
+
+    return {"downloads": results, "assemblies": assemblies}
+
+def print_batch_summary(summary):
+    downloads = summary["downloads"]
+    failed = [result for result in downloads if result["status"] != "ok"]
+    print(f"Downloaded {len(downloads) - len(failed)}/{len(downloads)} URLs.")
+    for result in downloads:
+        if result["status"] == "ok":
+            locations = ", ".join([*result["paths"], *result["assemblies"]])
+            print(f"  OK     {result['url']} ({result['seconds']}s) -> {locations}")
+        else:
+            print(f"  FAILED {result['url']} ({result['seconds']}s): {result['error']}")
+    for assembly in summary["assemblies"]:
+        if assembly["status"] == "ok":
+            print(f"Assembled {assembly['id']} -> {assembly['path']}")
+        else:
+            print(f"Assembly {assembly['id']} failed: {assembly['error']}")
     
 def main():
     while True:
         command = input("Enter command (e.g., ): ")
 
-        if command.startswith("download"):
-            args = command.split()
-            output_dir = None
-            youtube_urls = []
-            start_times = []
-            end_times = []
-            topic = None
-
-            for i, arg in enumerate(args):
-                if arg.startswith("--url"):
-                    # Check if there are enough elements in the list
-                    print("arg starts with url", arg)
-                    if i < len(args):
-                        start_index = arg.find("=") + 1  # Find the index of the first '=' sign and add 1 to exclude it
-                        end_index = arg.find("&") if "&" in arg else len(arg)  # Find the index of the first '&' sign
-                        youtube_url = arg[start_index:end_index]
-                        youtube_urls.append(youtube_url)
-                        start_time, end_time = parse_time_param(arg)  # Parse time parameters from the same argument
-                        start_times.append(start_time)
-                        end_times.append(end_time)
-                        print("start_time", start_time)
-                        print("end_time", end_time)
-                    else:
-                        print("Error: Insufficient arguments for URL.")
-                        break  # Exit the loop if there are insufficient arguments
-                elif arg.startswith("--topic="):
-                    topic = arg.split("=")[1]
-                    output_dir = f"ASSETS/VIDEOS/{topic}"
-
-            if topic == None:
-                output_dir = f"ASSETS/CLIPS"
-
-            if output_dir:
-                # Create the output directory if it doesn't exist
-                os.makedirs(output_dir, exist_ok=True)
-                
-                for i, url in enumerate(youtube_urls):
-                    assembly_folder = os.path.join(output_dir, "assembly")
-                    os.makedirs(assembly_folder, exist_ok=True)  # Create the 'assembly' folder if it doesn't exist
-                    download_from_yt(url, start_times[i], end_times[i], assembly_folder)
-                
-                    assembly_folder = os.path.abspath(assembly_folder)
-                    num_folders = len([name for name in os.listdir(assembly_folder) if os.path.isdir(os.path.join(assembly_folder, name))])
-
-                    if num_folders == 3:
-                        assemble_videos(topic, assembly_folder)
-
-        elif command.startswith("trim"):
-            # Parse command arguments
-            args = command.split()
-
-            # Extract parameters from command
-            path = ""
-            trim_start = 0
-            trim_end = 0
-
-            for arg in args:
-                if arg.startswith("--path="):
-                    path = arg.split("=")[1]
-                elif arg.startswith("--trim_start="):
-                    trim_start = arg.split("=")[1]
-                elif arg.startswith("--trim_end="):
-                    trim_end = arg.split("=")[1]
-            
-            trim_video(path, trim_start, trim_end)
-
-        elif command.startswith("connect"):
-            yt = get_youtube_service()
-            print(yt)
-
-        elif command.startswith("assemble"):
-            # Parse command arguments
-            args = command.split()
-
-            # Extract parameters from command
-            topic = None
-            id = ""
-
-            for arg in args:
-                if arg.startswith("--topic="):
-                    topic = arg.split("=")[1]
-                elif arg.startswith("--id="):
-                    id = arg.split("=")[1]
-                
-            if topic:
-                output_dir = f"ASSETS/VIDEOS/{topic}"
-                assembly_folder = os.path.abspath(os.path.join(output_dir, "assembly"))
-                assemble_videos(topic, assembly_folder)
-                # assemble_video(topic, id)
-
-        elif command.startswith("upload"):            
-            # Parse command arguments
-            args = command.split()
-
-            # Extract parameters from command
-            video_path = ""
-            title = ""
-            description = ""
-            tags = ""
-            category = ""
-            privacy_status = ""
-            topic = ""
-            id = ""
-            scheduleDateTime = ""
-
-            for arg in args:
-                if arg.startswith("--video_path="):
-                    video_path = arg.split("=")[1]
-                elif arg.startswith("--title="):
-                    title = arg.split("=")[1]
-                elif arg.startswith("--description="):
-                    description = arg.split("=")[1]
-                elif arg.startswith("--tags="):
-                    tags = arg.split("=")[1]
-                elif arg.startswith("--category="):
-                    category = arg.split("=")[1]
-                elif arg.startswith("--privacy_status="):
-                    privacy_status = arg.split("=")[1]
-                elif arg.startswith("--topic="):
-                    topic = arg.split("=")[1]
-                elif arg.startswith("--id="):
-                    id = arg.split("=")[1]
-                elif arg.startswith("--scheduleDateTime="):
-                    scheduleDateTime = arg.split("=")[1]
-
-            if not video_path and topic and id:
-                directory = os.path.join("ASSETS", "VIDEOS", topic, id)
-                # Assuming the first MP4 file is what you want
-                for file_name in os.listdir(directory):
-                    if file_name.endswith(".mp4"):
-                        video_path = os.path.join(directory, file_name)
-                        break  # Stop after finding the first MP4 file
-
-            # Call upload_to_youtube function
-            upload_to_youtube(video_path, title, description, tags, category, privacy_status, scheduleDateTime)
-
-
-        else:
+        handler = find_command(command)
+        if handler is None:
             print("Invalid command")
             continue
+        handler.handle(command)
 
         response = input("Do you want to continue? (y/n): ")
         if response.lower() == 'n':
@@ -489,4 +460,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # The command modules import from "main", make that this module instead of a second copy of it
+    sys.modules.setdefault("main", sys.modules["__main__"])
     main()
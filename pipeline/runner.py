@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from main import (
+    CLIPS_PER_ASSEMBLY, assemble_video, collect_assembly, download_segments_from_yt, move_clip_folder, time_to_seconds,
+    trim_video,
+)
+from edit.encode import ENCODE_WORKERS
+from edit.ffmpeg import DEFAULT_RESOLUTION, ENCODE_PRESET, ENCODE_CRF
+from lib.metrics import metrics
+from upload.upload_video import ThumbnailQuotaExceeded, YouTubeUploader
+
+STAGES = ("download", "trim", "assemble", "upload")
+DEFAULT_CONCURRENCY = {"download": 4, "trim": 2, "assemble": 1, "upload": 2}
+STAGING_LOCK = threading.Lock()  # Guards moving downloaded clips into the assembly folders
+
+
+class Task():
+    def __init__(self, name, stage, function, args=(), deps=()):
+        self.name = name
+        self.stage = stage
+        self.function = function
+        self.args = args
+        self.deps = list(deps)
+        self.status = "pending"  # pending -> running -> ok / failed / skipped
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    def run(self):
+        self.started = time.time()
+        try:
+            self.result = self.function(*self.args)
+            self.status = "ok"
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+        self.finished = time.time()
+        return self
+
+
+def load_manifest(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        if path.endswith((".yml", ".yaml")):
+            # PyYAML is only needed for YAML manifests
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("YAML manifests need PyYAML, install it or use a JSON manifest.")
+            return yaml.safe_load(file)
+        return json.load(file)
+
+def to_seconds(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return time_to_seconds(value)
+
+def download_source(source, assembly_folder, index):
+    # Like download_batch, every source downloads into its own staging folder and its clips are moved
+    # into the assembly folder afterwards, so two sources with the same title never share a folder
+    windows = [(to_seconds(start), to_seconds(end)) for start, end in source.get("windows") or [(None, None)]]
+    staging_folder = os.path.join(os.path.dirname(assembly_folder), "staging", str(index))
+    try:
+        output_file_paths = download_segments_from_yt(source["url"], windows, staging_folder)
+        with STAGING_LOCK:
+            return [move_clip_folder(output_file_path, assembly_folder, index) for output_file_path in output_file_paths]
+    finally:
+        shutil.rmtree(staging_folder, ignore_errors=True)
+        try:
+            # Only succeeds once the last source of the topic is done
+            os.rmdir(os.path.dirname(staging_folder))
+        except OSError:
+            pass
+
+def trim_clips(download_task, trim):
+    trimmed = []
+    for clip_path in download_task.result:
+        output_path = trim_video(clip_path, trim.get("start", 0), trim.get("end", 0), trim.get("mode", "auto"))
+        if output_path is None:
+            raise RuntimeError(f"Could not trim '{clip_path}'")
+        # The trimmed clip replaces the original so assembly only sees one version
+        os.replace(output_path, clip_path)
+        trimmed.append(clip_path)
+    return trimmed
+
+def assemble_topic(topic, assembly_folder, options):
+    num_folders = len([name for name in os.listdir(assembly_folder) if os.path.isdir(os.path.join(assembly_folder, name))])
+    if num_folders < CLIPS_PER_ASSEMBLY:
+        raise RuntimeError(f"Only {num_folders}/{CLIPS_PER_ASSEMBLY} clips downloaded for '{topic}'")
+    timestamp = collect_assembly(topic, assembly_folder)
+    return assemble_video(
+        topic, timestamp, False,
+        options.get("workers", ENCODE_WORKERS), options.get("preset", ENCODE_PRESET), options.get("crf", ENCODE_CRF),
+        options.get("reencode", False), options.get("profile", DEFAULT_RESOLUTION),
+    )
+
+def upload_topic(assemble_task, options):
+    uploader = YouTubeUploader("client_secrets.json", interactive=False)
+    tags = options.get("tags", uploader.DEFAULT_KEYWORDS)
+    if isinstance(tags, list):
+        tags = ",".join(tags)
+    try:
+        uploader.initialize_upload({
+            "file": assemble_task.result,
+            "title": options.get("title", ""),
+            "description": options.get("description", ""),
+            "keywords": tags,
+            "category": options.get("category", uploader.DEFAULT_CATEGORY),
+            "privacyStatus": options.get("privacy_status", uploader.DEFAULT_PRIVACYSTATUS),
+            "scheduleDateTime": options.get("schedule"),
+            "set_thumbnail": options.get("set_thumbnail", True),
+        })
+    except ThumbnailQuotaExceeded as e:
+        # The video is up, only its thumbnail is missing
+        print(str(e))
+    return assemble_task.result
+
+def build_tasks(manifest):
+    tasks = []
+    for topic in manifest["topics"]:
+        name = topic["name"]
+        assembly_folder = os.path.abspath(os.path.join("ASSETS", "VIDEOS", name, "assembly"))
+        os.makedirs(assembly_folder, exist_ok=True)
+
+        clip_tasks = []
+        for i, source in enumerate(topic.get("sources", [])):
+            download_task = Task(f"{name}/download/{i + 1}", "download", download_source, (source, assembly_folder, i))
+            tasks.append(download_task)
+            clip_task = download_task
+            if source.get("trim"):
+                clip_task = Task(f"{name}/trim/{i + 1}", "trim", trim_clips, (download_task, source["trim"]), [download_task])
+                tasks.append(clip_task)
+            clip_tasks.append(clip_task)
+
+        if topic.get("assemble", {}) is False:
+            continue
+        assemble_task = Task(f"{name}/assemble", "assemble", assemble_topic, (name, assembly_folder, topic.get("assemble") or {}), clip_tasks)
+        tasks.append(assemble_task)
+
+        if topic.get("upload"):
+            tasks.append(Task(f"{name}/upload", "upload", upload_topic, (assemble_task, topic["upload"]), [assemble_task]))
+    return tasks
+
+def run_tasks(tasks, concurrency):
+    # Every stage has its own pool, so downloads of one topic overlap encodes and uploads of others
+    pools = {stage: ThreadPoolExecutor(max_workers=concurrency[stage]) for stage in STAGES}
+    running = {}
+    try:
+        while True:
+            for task in tasks:
+                if task.status != "pending":
+                    continue
+                if any(dep.status in ("failed", "skipped") for dep in task.deps):
+                    task.status = "skipped"
+                    task.error = "a dependency failed"
+                    print(f"[{task.name}] skipped, a dependency failed")
+                elif all(dep.status == "ok" for dep in task.deps):
+                    task.status = "running"
+                    print(f"[{task.name}] started")
+                    running[pools[task.stage].submit(task.run)] = task
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                if task.status == "ok":
+                    print(f"[{task.name}] done in {task.finished - task.started:.1f}s")
+                else:
+                    print(f"[{task.name}] failed: {task.error}")
+    finally:
+        for pool in pools.values():
+            pool.shutdown()
+
+def stage_report(tasks):
+    report = {}
+    for stage in STAGES:
+        timed = [task for task in tasks if task.stage == stage and task.started is not None]
+        if not timed:
+            continue
+        report[stage] = {
+            "tasks": len(timed),
+            "failed": len([task for task in timed if task.status == "failed"]),
+            # Wall time is first start to last finish, busy time the sum over tasks
+            "wall_seconds": round(max(task.finished for task in timed) - min(task.started for task in timed), 2),
+            "busy_seconds": round(sum(task.finished - task.started for task in timed), 2),
+        }
+    return report
+
+def run_manifest(path):
+    manifest = load_manifest(path)
+    concurrency = dict(DEFAULT_CONCURRENCY, **manifest.get("concurrency", {}))
+
+    started = time.time()
+    tasks = build_tasks(manifest)
+    run_tasks(tasks, concurrency)
+
+    report = {
+        "wall_seconds": round(time.time() - started, 2),
+        "stages": stage_report(tasks),
+        "tasks": [{"name": task.name, "status": task.status, "error": task.error} for task in tasks],
+    }
+    print(f"Finished in {report['wall_seconds']}s")
+    for stage, stats in report["stages"].items():
+        metrics.set("pipeline_stage_wall_seconds", stats["wall_seconds"], stage=stage)
+        metrics.set("pipeline_stage_busy_seconds", stats["busy_seconds"], stage=stage)
+        metrics.record("pipeline_stage", stage=stage, **stats)
+        print(f"  {stage:<9} {stats['tasks']} tasks, {stats['failed']} failed, wall {stats['wall_seconds']}s, busy {stats['busy_seconds']}s")
+    metrics.write_prometheus()
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        exit("Usage: python -m pipeline.runner <manifest.json|manifest.yaml>")
+    report = run_manifest(sys.argv[1])
+    if any(task["status"] != "ok" for task in report["tasks"]):
+        sys.exit(1)
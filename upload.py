@@ -1,13 +1,20 @@
 import os
-import json
 import random
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from upload.upload_video import YouTubeUploader
+from lib.fingerprint import FingerprintIndex
+from lib.metrics import metrics
+from upload.limiter import QuotaExceeded, QuotaLimiter, TokenBucket
+from upload.schedule_store import HEARTBEAT_SECONDS, ScheduleStore
+from upload.upload_video import MB, ThumbnailQuotaExceeded, YouTubeUploader, format_progress
 
 CLIPS_DIR = "../../EXPORT/CLIPS/READY"
-SCHEDULE_LOG = "../../EXPORT/CLIPS/00_schedule.json"
+SCHEDULE_LOG = "../../EXPORT/CLIPS/00_schedule.json"  # Legacy log, imported once into SCHEDULE_DB
+SCHEDULE_DB = "../../EXPORT/CLIPS/00_schedule.sqlite"
 SCHEDULED_DIR = "../../EXPORT/CLIPS/SCHEDULED"
+FINGERPRINTS = "../../EXPORT/CLIPS/00_fingerprints.npz"
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOADED_DIR = "../../EXPORT/CLIPS/UPLOADED"
 UPLOAD_TIMES = [
@@ -20,95 +27,131 @@ UPLOAD_TIMES = [
     "18:00:00",
     "20:00:00",
 ]
+CLIPS_PER_DAY = len(UPLOAD_TIMES)
+UPLOAD_WORKERS = 3
+UPLOAD_BANDWIDTH = None  # Bytes per second for the whole account, None for no limit
+SET_THUMBNAILS = False  # thumbnails.set costs 50 quota units per video on top of the upload
 
 class AutoUpload():
-    def  __init__(self):
-        pass
+    def  __init__(self, workers=UPLOAD_WORKERS, bandwidth=UPLOAD_BANDWIDTH, thumbnails=SET_THUMBNAILS):
+        self.workers = workers
+        self.thumbnails = thumbnails
+        self.quota = QuotaLimiter()
+        self.bandwidth = TokenBucket(bandwidth, bandwidth * 2) if bandwidth else None
+        self.log_lock = threading.Lock()
+        self.store = ScheduleStore(SCHEDULE_DB, SCHEDULE_LOG)
+        self.fingerprints = FingerprintIndex(FINGERPRINTS)
+        self.transfers = {}  # Latest progress per file, for the combined rate of all workers
 
-    def update_schedule(self):
-        while True:
-            # Load schedule log
-            with open(SCHEDULE_LOG, 'r') as file:
-                schedule_data = json.load(file)
-            
-            # Get the last scheduled day
-            last_scheduled_day = schedule_data['scheduled_days'][-1]['date']
-            
-            # Get next day
-            next_day = datetime.strptime(last_scheduled_day, '%Y%m%d') + timedelta(days=1)
-            next_day_string = next_day.strftime('%Y%m%d')
-            
-            # Move files to scheduled folder
-            self.move_files_to_scheduled_folder(next_day_string)
-            
-            # Update schedule log
-            clips_info = []
-            folder_path = os.path.join(SCHEDULED_DIR, next_day_string)
-            upload_times_index = 0  # Keep track of the index for upload times
-            for file_name in os.listdir(folder_path):
-                if file_name.endswith('.txt'):
-                    with open(os.path.join(folder_path, file_name), 'r', encoding='utf-8') as txt_file:
-                        title = txt_file.readline().strip()
-                        description = txt_file.read().strip()
-                        description = description.replace('memezar', 'popcorn-clips-and-chill')
-                        if 'follow' not in description.lower():
-                            description = f"🎬⭐Follow us for more Popcorn, Clips & Chill.\n\n{description}"
-                        clips_info.append({
-                            "time": UPLOAD_TIMES[upload_times_index],  # Use upload times sequentially
-                            "title": title,
-                            "description": description,
-                            "file_name": file_name.replace(".txt", ".mp4")
-                        })
-                        upload_times_index += 1  # Move to the next upload time
-            
-            self.update_schedule_log(next_day_string, clips_info)
-
-            # Check if there are fewer than 8 clips scheduled
-            num_scheduled_clips = len(clips_info)
-            if num_scheduled_clips < 8:
-                print(f"Scheduled {num_scheduled_clips} clips for {next_day_string}.")
-                break  # Exit the loop if there are fewer than 8 clips scheduled
-            else:
-                print(f"Scheduled 8 clips for {next_day_string}.")
-
-    def move_files_to_scheduled_folder(self, date_string):
-        # Create folder if it doesn't exist
-        folder_path = os.path.join(SCHEDULED_DIR, date_string)
-        os.makedirs(folder_path, exist_ok=True)
-        
-        try:
-            # Randomly select 8 clips
-            clips = random.sample([file for file in os.listdir(CLIPS_DIR) if file.endswith('.mp4')], 8)
-        except ValueError as e:
+    def report_progress(self, progress):
+        with self.log_lock:
+            self.transfers[progress["file"]] = progress
+            active = [transfer for transfer in self.transfers.values() if transfer["sent"] < transfer["total"]]
+            combined = sum(transfer["bytes_per_second"] for transfer in active)
+            print(
+                f"{os.path.basename(progress['file'])}: {format_progress(progress)} "
+                f"| {len(active)} active, {combined / MB:.2f} MB/s combined"
+            )
+
+    def scan_ready_clips(self):
+        # A single listing of CLIPS_DIR, only clips that come with their .txt metadata are schedulable
+        with metrics.timer("schedule_scan_seconds") as fields:
+            file_names = set(os.listdir(CLIPS_DIR))
+            ready = sorted(
+                file_name for file_name in file_names
+                if file_name.endswith('.mp4') and os.path.splitext(file_name)[0] + ".txt" in file_names
+            )
+            fields.update(files=len(file_names), ready=len(ready))
+        metrics.set("schedule_ready_clips", len(ready))
+        return ready
+
+    def read_clip_metadata(self, txt_path):
+        with open(txt_path, 'r', encoding='utf-8') as txt_file:
+            title = txt_file.readline().strip()
+            description = txt_file.read().strip()
+        description = description.replace('memezar', 'popcorn-clips-and-chill')
+        if 'follow' not in description.lower():
+            description = f"🎬⭐Follow us for more Popcorn, Clips & Chill.\n\n{description}"
+        return title, description
+
+    def plan_schedule(self, inventory, first_day, days=None):
+        # Randomly spread the READY clips over consecutive days, CLIPS_PER_DAY each. Near-duplicates of a clip
+        # picked earlier, or of one that was scheduled or uploaded before, are left out and stay in READY.
+        available = list(inventory)
+        random.shuffle(available)
+        available, duplicates = self.fingerprints.unique(available, exclude=set(inventory))
+        plan = []
+        day = first_day
+        while len(available) >= CLIPS_PER_DAY and (days is None or len(plan) < days):
+            plan.append((day.strftime('%Y%m%d'), available[:CLIPS_PER_DAY]))
+            available = available[CLIPS_PER_DAY:]
+            day += timedelta(days=1)
+        return plan, available, duplicates
+
+    def apply_schedule(self, plan):
+        # One day at a time, its clips are moved and then recorded. When that fails the day's clips go back to
+        # READY, so every clip in SCHEDULED has its row and the next run plans the rest again.
+        for date_string, clips in plan:
+            # Create folder if it doesn't exist
+            folder_path = os.path.join(SCHEDULED_DIR, date_string)
+            os.makedirs(folder_path, exist_ok=True)
+
+            moved = []
+            try:
+                clips_info = []
+                for upload_times_index, clip in enumerate(clips):
+                    # Move clip and corresponding txt file
+                    txt_name = os.path.splitext(clip)[0] + ".txt"
+                    for name in (clip, txt_name):
+                        os.rename(os.path.join(CLIPS_DIR, name), os.path.join(folder_path, name))
+                        moved.append(name)
+
+                    # Only the picked clips get their metadata read
+                    title, description = self.read_clip_metadata(os.path.join(folder_path, txt_name))
+                    clips_info.append({
+                        "time": UPLOAD_TIMES[upload_times_index],  # Use upload times sequentially
+                        "title": title,
+                        "description": description,
+                        "file_name": clip
+                    })
+                self.store.add_days([(date_string, clips_info)])
+            except Exception:
+                for name in moved:
+                    os.rename(os.path.join(folder_path, name), os.path.join(CLIPS_DIR, name))
+                if not os.listdir(folder_path):
+                    os.rmdir(folder_path)
+                raise
+
+    def update_schedule(self, days=None):
+        inventory = self.scan_ready_clips()
+        self.fingerprints.update(CLIPS_DIR, inventory)
+
+        # Plan from the day after the last scheduled day
+        last_scheduled_day = self.store.last_scheduled_date()
+        if last_scheduled_day:
+            first_day = datetime.strptime(last_scheduled_day, '%Y%m%d') + timedelta(days=1)
+        else:
+            first_day = datetime.now()
+
+        plan, remaining, duplicates = self.plan_schedule(inventory, first_day, days)
+        for clip in duplicates:
+            print(f"Skipped '{clip}', it is a near-duplicate of another clip.")
+        metrics.set("schedule_duplicate_clips", len(duplicates))
+        if not plan:
             # Handle the case where there are not enough clips available
-            num_available_clips = len([file for file in os.listdir(CLIPS_DIR) if file.endswith('.mp4')])
-            raise ValueError(f"There are only {num_available_clips}/8 CLIPS available. Please add {8 - num_available_clips} CLIPS in order to schedule a new day.")
-
-        for clip in clips:
-            # Move clip and corresponding txt file
-            clip_path = os.path.join(CLIPS_DIR, clip)
-            txt_path = os.path.splitext(clip_path)[0] + ".txt"
-            os.rename(clip_path, os.path.join(folder_path, clip))
-            os.rename(txt_path, os.path.join(folder_path, os.path.basename(txt_path)))
-
-    def update_schedule_log(self, date_string, clips_info):
-        with open(SCHEDULE_LOG, 'r+') as file:
-            schedule_data = json.load(file)
-            
-            # Update scheduled days
-            schedule_data['scheduled_days'].append({
-                "date": date_string,
-                "clips": clips_info
-            })
-            
-            # Rewind the file pointer to overwrite the file
-            file.seek(0)
-            json.dump(schedule_data, file, indent=4)
-            file.truncate()
+            num_available_clips = len(remaining)
+            raise ValueError(f"There are only {num_available_clips}/{CLIPS_PER_DAY} CLIPS available. Please add {CLIPS_PER_DAY - num_available_clips} CLIPS in order to schedule a new day.")
+
+        self.apply_schedule(plan)
+        for date_string, clips in plan:
+            print(f"Scheduled {len(clips)} clips for {date_string}.")
+        print(f"{len(remaining)} READY clips left unscheduled.")
 
     def upload_to_youtube(self):
-        # Initialize YouTubeUploader
-        uploader = YouTubeUploader("client_secrets.json")
+        # Initialize YouTubeUploader, shared by all workers together with the quota and bandwidth limiters
+        uploader = YouTubeUploader(
+            "client_secrets.json", quota=self.quota, bandwidth=self.bandwidth, interactive=False, progress=self.report_progress
+        )
 
         # Get today's date
         today = datetime.now().date()
@@ -116,88 +159,127 @@ class AutoUpload():
         # Generate the "upcoming_week" of 7 days into the future including today
         upcoming_week = [(today + timedelta(days=i)).strftime("%Y%m%d") for i in range(7)]
 
-        # Load SCHEDULE_LOG JSON
-        with open(SCHEDULE_LOG, "r") as f:
-            schedule_log = json.load(f)
+        # Clips a crashed run left half uploaded go back to the queue
+        recovered = self.store.recover()
+        if recovered:
+            print(f"{recovered} clips of an interrupted run are scheduled again.")
 
-        # Loop over upcoming_week
+        # Collect the clips first, prompts for missing fields have to happen on this thread
+        jobs = []
+        clips = self.store.clips_for_dates(upcoming_week)
         for index, upcoming_day in enumerate(upcoming_week):
             print(f'upcoming day {index} {"(today)" if index == 0 else ""}{"(tomorrow)" if index == 1 else ""}({upcoming_day})')
-            # Find match between upcoming_day and scheduled_day
-            for scheduled_day in schedule_log["scheduled_days"]:
-                if upcoming_day == scheduled_day["date"]:
-                    # Loop over the clips
-                    for clip_index, clip in enumerate(scheduled_day["clips"]):
-                        # Check if clip has time, title, description, and file_name
-                        if "time" not in clip or "title" not in clip or "description" not in clip or "file_name" not in clip:
-                            # Ask for input
-                            clip["time"] = input("Enter clip time: ")
-                            clip["title"] = input("Enter clip title: ")
-                            clip["description"] = input("Enter clip description: ")
-                            clip["file_name"] = input("Enter clip file name: ")
-
-                        # Create options object
-                        scheduled_day_date = datetime.strptime(scheduled_day["date"], "%Y%m%d").strftime("%Y-%m-%d")
-                        rel_file_path = f"../../EXPORT/CLIPS/SCHEDULED/{scheduled_day['date']}/{clip['file_name']}"
-                        abs_file_path = os.path.abspath(os.path.join(CURRENT_DIR, rel_file_path))
-                        options = {
-                            "file": abs_file_path,
-                            "title": clip["title"],
-                            "description": f"{clip['description']}\n\n",
-                            "keywords": getattr(uploader, "DEFAULT_KEYWORDS", None),
-                            "category": getattr(uploader, "DEFAULT_CATEGORY", None),
-                            "privacyStatus":  getattr(uploader, "DEFAULT_PRIVACYSTATUS", None),
-                            "scheduleDateTime": f"{scheduled_day_date}T{clip['time']}Z",
-                            "set_thumbnail": False
-                        }
-
-                        # Upload the video
-                        print("Uploading video...")
-                        print("options", options)
-                        uploader.initialize_upload(options) #UPLOAD TO YT
-                        print("Video uploaded successfully.")
-
-                        # Update schedule_log JSON
-                        # Create a new entry in uploaded_to_yt
-                        uploaded_clip = clip.copy()
-                        uploaded_clip["file_name"] = f"{clip['file_name']}-yt.mp4"
-                        uploaded_clip["uploaded_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                        # Append the uploaded clip to uploaded_to_yt
-                        schedule_log["uploaded_to_yt"].append({
-                            "date": scheduled_day["date"],
-                            "clips": [uploaded_clip]
-                        })
-
-                        # Remove the uploaded clip from scheduled_days/day/clips array
-                        scheduled_day["clips"][clip_index]
-                        del scheduled_day["clips"][clip_index]
-
-                        # Update the SCHEDULE_LOG JSON file
-                        with open(SCHEDULE_LOG, "w") as f:
-                            json.dump(schedule_log, f, indent=4)
-
-                        # Move the video and text file to UPLOADED directory
-                        old_video_path = os.path.join("..", "..", "EXPORT", "CLIPS", "SCHEDULED", scheduled_day["date"], clip['file_name'])
-                        new_video_name = clip['file_name'].replace(".mp4", "-yt.mp4")
-                        new_video_path = os.path.join("..", "..", "EXPORT", "CLIPS", "UPLOADED", scheduled_day["date"], new_video_name)
-
-                        # Create the directory if it doesn't exist
-                        new_video_dir = os.path.dirname(new_video_path)
-                        if not os.path.exists(new_video_dir):
-                            os.makedirs(new_video_dir)
-
-                        shutil.move(old_video_path, new_video_path)
-
-                        # Also move the corresponding text file if it exists
-                        old_text_path = os.path.splitext(old_video_path)[0] + ".txt"
-                        if os.path.exists(old_text_path):
-                            new_text_name = os.path.splitext(new_video_name)[0] + ".txt"
-                            new_text_path = os.path.join(new_video_dir, new_text_name)
-                            shutil.move(old_text_path, new_text_path)
-
-                        # VIDEO UPLOADED - FILES MOVED
-                        # break # ONLY 1 VIDEO A DAY
+            for clip in clips:
+                if clip["date"] != upcoming_day:
+                    continue
+                # Check if clip has time, title, description, and file_name
+                if not clip["time"] or not clip["title"] or not clip["description"] or not clip["file_name"]:
+                    # Ask for input
+                    clip["time"] = input("Enter clip time: ")
+                    clip["title"] = input("Enter clip title: ")
+                    clip["description"] = input("Enter clip description: ")
+                    clip["file_name"] = input("Enter clip file name: ")
+                    self.store.update_clip(clip["id"], clip)
+                jobs.append(clip)
+
+        quota_exhausted = threading.Event()
+
+        def upload_job(clip):
+            # Once the quota is gone the remaining clips stay scheduled for the next run
+            if quota_exhausted.is_set():
+                return "deferred"
+            if not self.store.mark_uploading(clip["id"]):
+                return "skipped"  # Another run claimed it
+
+            # Create options object
+            scheduled_day_date = datetime.strptime(clip["date"], "%Y%m%d").strftime("%Y-%m-%d")
+            rel_file_path = f"../../EXPORT/CLIPS/SCHEDULED/{clip['date']}/{clip['file_name']}"
+            abs_file_path = os.path.abspath(os.path.join(CURRENT_DIR, rel_file_path))
+            options = {
+                "file": abs_file_path,
+                "title": clip["title"],
+                "description": f"{clip['description']}\n\n",
+                "keywords": getattr(uploader, "DEFAULT_KEYWORDS", None),
+                "category": getattr(uploader, "DEFAULT_CATEGORY", None),
+                "privacyStatus":  getattr(uploader, "DEFAULT_PRIVACYSTATUS", None),
+                "scheduleDateTime": f"{scheduled_day_date}T{clip['time']}Z",
+                "set_thumbnail": self.thumbnails
+            }
+
+            # Upload the video
+            print("Uploading video...")
+            print("options", options)
+            try:
+                uploader.initialize_upload(options) #UPLOAD TO YT
+            except ThumbnailQuotaExceeded as e:
+                # Uploaded, it is recorded below, but nothing else fits into today's quota
+                print(str(e))
+                quota_exhausted.set()
+            except QuotaExceeded as e:
+                print(str(e))
+                quota_exhausted.set()
+                self.store.mark_scheduled(clip["id"])
+                return "deferred"
+            except Exception as e:
+                print(f"Upload of '{clip['file_name']}' failed: {e}")
+                self.store.mark_scheduled(clip["id"])
+                return "failed"
+            print("Video uploaded successfully.")
+
+            self.record_upload(clip)
+            return "uploaded"
+
+        # Keeps this run's claims fresh while the uploads take their time
+        uploads_done = threading.Event()
+
+        def heartbeat():
+            while not uploads_done.wait(HEARTBEAT_SECONDS):
+                self.store.heartbeat()
+
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                outcomes = list(pool.map(upload_job, jobs))
+        finally:
+            uploads_done.set()
+            heartbeat_thread.join()
+
+        print(f"Uploaded {outcomes.count('uploaded')}/{len(jobs)} clips, {outcomes.count('failed')} failed, {outcomes.count('deferred')} carried over to the next run.")
+
+    def record_upload(self, clip):
+        # Workers finish in any order, only one of them may move files at a time
+        with self.log_lock:
+            # Mark the clip as uploaded, a single row update instead of rewriting the whole log
+            uploaded_file_name = f"{clip['file_name']}-yt.mp4"
+            uploaded_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.store.mark_uploaded(clip["id"], uploaded_file_name, uploaded_at)
+
+            # Move the video and text file to UPLOADED directory
+            old_video_path = os.path.join("..", "..", "EXPORT", "CLIPS", "SCHEDULED", clip["date"], clip['file_name'])
+            new_video_name = clip['file_name'].replace(".mp4", "-yt.mp4")
+            new_video_path = os.path.join("..", "..", "EXPORT", "CLIPS", "UPLOADED", clip["date"], new_video_name)
+
+            # Create the directory if it doesn't exist
+            new_video_dir = os.path.dirname(new_video_path)
+            if not os.path.exists(new_video_dir):
+                os.makedirs(new_video_dir)
+
+            shutil.move(old_video_path, new_video_path)
+
+            # Also move the corresponding text file if it exists
+            old_text_path = os.path.splitext(old_video_path)[0] + ".txt"
+            if os.path.exists(old_text_path):
+                new_text_name = os.path.splitext(new_video_name)[0] + ".txt"
+                new_text_path = os.path.join(new_video_dir, new_text_name)
+                shutil.move(old_text_path, new_text_path)
+
+            # And the thumbnail that was extracted for it
+            old_thumbnail_path = os.path.splitext(old_video_path)[0] + ".jpg"
+            if os.path.exists(old_thumbnail_path):
+                shutil.move(old_thumbnail_path, os.path.join(new_video_dir, os.path.splitext(new_video_name)[0] + ".jpg"))
+
+            # VIDEO UPLOADED - FILES MOVED
 
 def main():
 
@@ -210,6 +292,7 @@ def main():
         pass
     
     self.upload_to_youtube()
+    metrics.write_prometheus()
     # while True:
     #     command = input("Enter command (e.g., ): ")
     #     if command.startswith("update"):
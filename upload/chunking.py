@@ -0,0 +1,40 @@
+CHUNK_GRANULARITY = 256 * 1024  # Resumable uploads only accept chunks in multiples of 256 KB
+MIN_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 128 * 1024 * 1024
+TARGET_CHUNK_SECONDS = 10  # A failed chunk costs at most about this much retransmit
+RATE_SMOOTHING = 0.3
+GROWTH_COOLDOWN = 3  # Full chunks that have to succeed after a failure before the size grows again
+
+
+class AdaptiveChunkSize():
+    def __init__(self, initial, minimum=MIN_CHUNK_SIZE, maximum=MAX_CHUNK_SIZE, target_seconds=TARGET_CHUNK_SECONDS):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.rate = None  # Smoothed bytes per second over recent chunks
+        self.cooldown = 0
+        self.size = self.clamp(initial)
+
+    def clamp(self, size):
+        size = max(self.minimum, min(self.maximum, int(size)))
+        return size - size % CHUNK_GRANULARITY
+
+    def success(self, sent, seconds):
+        # The final short chunk says nothing about what the link can carry
+        if sent < self.size or seconds <= 0:
+            return self.size
+        rate = sent / seconds
+        self.rate = rate if self.rate is None else RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.rate
+
+        # Aim for chunks that take target_seconds, at most doubling per step and not at all right after a failure
+        target = self.rate * self.target_seconds
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            target = min(target, self.size)
+        self.size = self.clamp(min(target, self.size * 2))
+        return self.size
+
+    def failure(self):
+        self.size = self.clamp(self.size // 2)
+        self.cooldown = GROWTH_COOLDOWN
+        return self.size
@@ -0,0 +1,211 @@
+import re
+import json
+import time
+import random
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from upload.limiter import TokenBucket
+
+READ_BLOCK = 64 * 1024
+RETRIABLE_ERRORS = (500, 502, 503, 504)
+
+# Just enough of the YouTube Data API v3 discovery document for videos.insert and thumbnails.set,
+# googleapiclient builds the same request objects from it as from the real one
+DISCOVERY_DOCUMENT = {
+    "kind": "discovery#restDescription",
+    "discoveryVersion": "v1",
+    "id": "youtube:v3",
+    "name": "youtube",
+    "version": "v3",
+    "protocol": "rest",
+    "rootUrl": "{root}",
+    "servicePath": "youtube/v3/",
+    "baseUrl": "{root}youtube/v3/",
+    "batchPath": "batch/youtube/v3",
+    "parameters": {
+        "alt": {"type": "string", "default": "json", "enum": ["json"], "location": "query"},
+    },
+    "schemas": {
+        "Video": {"id": "Video", "type": "object", "properties": {"id": {"type": "string"}}},
+        "ThumbnailSetResponse": {"id": "ThumbnailSetResponse", "type": "object", "properties": {"kind": {"type": "string"}}},
+    },
+    "resources": {
+        "videos": {"methods": {"insert": {
+            "id": "youtube.videos.insert",
+            "path": "videos",
+            "httpMethod": "POST",
+            "parameters": {"part": {"type": "string", "required": True, "repeated": True, "location": "query"}},
+            "parameterOrder": ["part"],
+            "request": {"$ref": "Video"},
+            "response": {"$ref": "Video"},
+            "supportsMediaUpload": True,
+            "mediaUpload": {
+                "accept": ["video/*", "application/octet-stream"],
+                "maxSize": "256GB",
+                "protocols": {
+                    "simple": {"multipart": True, "path": "videos"},
+                    "resumable": {"multipart": True, "path": "videos"},
+                },
+            },
+        }}},
+        "thumbnails": {"methods": {"set": {
+            "id": "youtube.thumbnails.set",
+            "path": "thumbnails/set",
+            "httpMethod": "POST",
+            "parameters": {"videoId": {"type": "string", "required": True, "location": "query"}},
+            "parameterOrder": ["videoId"],
+            "response": {"$ref": "ThumbnailSetResponse"},
+            "supportsMediaUpload": True,
+            "mediaUpload": {
+                "accept": ["image/jpeg", "image/png", "application/octet-stream"],
+                "maxSize": "2MB",
+                "protocols": {
+                    "simple": {"multipart": True, "path": "thumbnails/set"},
+                    "resumable": {"multipart": True, "path": "thumbnails/set"},
+                },
+            },
+        }}},
+    },
+}
+
+
+def discovery_document(root_url):
+    return json.dumps(DISCOVERY_DOCUMENT).replace("{root}", root_url)
+
+
+class FakeYouTubeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_status(self, status):
+        self.send_json(status, {"error": {"code": status, "message": "Injected error", "errors": [{"reason": "backendError"}]}})
+
+    def read_body(self):
+        # The bandwidth cap is shared by every connection, like the uplink it stands in for
+        remaining = int(self.headers.get("Content-Length", 0))
+        blocks = []
+        while remaining > 0:
+            block = self.rfile.read(min(READ_BLOCK, remaining))
+            if not block:
+                break
+            if self.server.bandwidth is not None:
+                self.server.bandwidth.consume(len(block))
+            self.server.record(bytes_received=len(block))
+            blocks.append(block)
+            remaining -= len(block)
+        return b''.join(blocks)
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        body = self.read_body()
+
+        if url.path == "/upload/youtube/v3/videos" and query.get("uploadType") == ["resumable"]:
+            upload_id = uuid.uuid4().hex
+            total = int(self.headers.get("X-Upload-Content-Length", -1))
+            self.server.start_session(upload_id, total, json.loads(body or b'{}'))
+            location = f"{self.server.root_url}upload/youtube/v3/videos?uploadType=resumable&upload_id={upload_id}"
+            self.send_json(200, {}, {"Location": location})
+        elif url.path == "/upload/youtube/v3/thumbnails/set":
+            self.server.record(thumbnails=1)
+            self.send_json(200, {"kind": "youtube#thumbnailSetResponse", "items": [{"default": {"url": "http://localhost/thumbnail.jpg"}}]})
+        else:
+            self.send_json(404, {"error": {"code": 404, "message": f"Unknown path {url.path}"}})
+
+    def do_PUT(self):
+        time.sleep(self.server.latency)
+        query = parse_qs(urlparse(self.path).query)
+        session = self.server.sessions.get(query.get("upload_id", [""])[0])
+        body = self.read_body()
+        if session is None:
+            self.send_json(404, {"error": {"code": 404, "message": "Upload session not found"}})
+            return
+
+        # "bytes 0-1048575/67108864" for a chunk, "bytes */67108864" when the client asks for its offset
+        match = re.match(r'bytes (\*|(\d+)-(\d+))/(\d+|\*)', self.headers.get("Content-Range", ""))
+        if match and match.group(1) != "*" and body:
+            if self.server.inject_error():
+                self.send_error_status(self.server.random.choice(RETRIABLE_ERRORS))
+                return
+            start = int(match.group(2))
+            with self.server.lock:
+                if session["first_byte"] is None:
+                    session["first_byte"] = time.time()
+                # Only a chunk continuing exactly at the acknowledged offset moves the upload forward
+                if start == session["received"]:
+                    session["received"] += len(body)
+                    session["chunks"] += 1
+            if match.group(4) != "*":
+                session["total"] = int(match.group(4))
+
+        if session["total"] >= 0 and session["received"] >= session["total"]:
+            session["completed"] = session["completed"] or time.time()
+            self.send_json(200, {"kind": "youtube#video", "id": session["id"], "snippet": session["metadata"].get("snippet", {})})
+        elif session["received"] > 0:
+            self.send_json(308, {}, {"Range": f"bytes=0-{session['received'] - 1}"})
+        else:
+            self.send_json(308, {})
+
+
+class FakeYouTubeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, bandwidth=None, error_rate=0.0, seed=0):
+        super().__init__((host, port), FakeYouTubeHandler)
+        self.root_url = f"http://{host}:{self.server_address[1]}/"
+        self.latency = latency  # Seconds added to every request
+        self.bandwidth = TokenBucket(bandwidth, bandwidth / 10) if bandwidth else None  # Bytes per second
+        self.error_rate = error_rate  # Share of upload chunks answered with a 5xx
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.stats = {"bytes_received": 0, "errors_injected": 0, "thumbnails": 0}
+
+    def record(self, **counts):
+        with self.lock:
+            for name, count in counts.items():
+                self.stats[name] += count
+
+    def inject_error(self):
+        with self.lock:
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.stats["errors_injected"] += 1
+        return failed
+
+    def start_session(self, upload_id, total, metadata):
+        with self.lock:
+            self.sessions[upload_id] = {
+                "id": f"fake{len(self.sessions):07d}",
+                "total": total,
+                "metadata": metadata,
+                "received": 0,
+                "chunks": 0,
+                "started": time.time(),
+                "first_byte": None,
+                "completed": None,
+            }
+
+    def discovery_document(self):
+        return discovery_document(self.root_url)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
@@ -0,0 +1,87 @@
+import os
+import json
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from lib.storage import atomic_write
+
+QUOTA_FILE = "upload_quota.json"
+DAILY_QUOTA = 10000  # Default YouTube Data API units per project per day
+QUOTA_COSTS = {
+    "videos.insert": 1600,
+    "thumbnails.set": 50,
+    "captions.list": 50,
+    "captions.download": 200,
+}
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")  # The quota resets at midnight Pacific time
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class TokenBucket():
+    def __init__(self, rate, capacity=None):
+        self.rate = rate  # Tokens per second
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        # Take the tokens right away and sleep off the debt, so requests larger than the capacity still pass
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class QuotaLimiter():
+    def __init__(self, daily_quota=DAILY_QUOTA, path=QUOTA_FILE):
+        self.daily_quota = daily_quota
+        self.path = path
+        self.lock = threading.Lock()
+
+    def today(self):
+        return datetime.now(QUOTA_TIMEZONE).strftime("%Y%m%d")
+
+    def load(self):
+        state = None
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as file:
+                state = json.load(file)
+        # A new quota day starts from zero
+        if state is None or state["date"] != self.today():
+            state = {"date": self.today(), "used": 0}
+        return state
+
+    def save(self, state):
+        with atomic_write(self.path) as file:
+            json.dump(state, file, indent=4)
+
+    def remaining(self):
+        with self.lock:
+            return max(0, self.daily_quota - self.load()["used"])
+
+    def reserve(self, operation):
+        cost = QUOTA_COSTS[operation]
+        with self.lock:
+            state = self.load()
+            if state["used"] + cost > self.daily_quota:
+                raise QuotaExceeded(f"Daily quota exhausted ({state['used']}/{self.daily_quota} units used), {operation} needs {cost}.")
+            state["used"] += cost
+            self.save(state)
+
+    def exhaust(self):
+        # The API disagreed with our bookkeeping, trust the API for the rest of the day
+        with self.lock:
+            state = self.load()
+            state["used"] = self.daily_quota
+            self.save(state)
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+
+from lib.storage import Database
+
+CLIP_FIELDS = ("time", "title", "description", "file_name")
+HEARTBEAT_SECONDS = 60  # How often a run refreshes the clips it is uploading
+STALE_SECONDS = 15 * 60  # A claim without a heartbeat for this long belongs to a run that died
+
+
+# Clips move scheduled -> uploading -> uploaded, a failed or interrupted upload goes back to scheduled.
+# An uploading clip records the run that claimed it and when that run last reported in.
+class ScheduleStore(Database):
+    def __init__(self, db_path, legacy_json_path=None):
+        super().__init__(db_path)
+        self.legacy_json_path = legacy_json_path
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def create_schema(self, connection):
+        connection.row_factory = sqlite3.Row
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS days (date TEXT PRIMARY KEY)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS clips ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, time TEXT, title TEXT, "
+                "description TEXT, file_name TEXT, state TEXT NOT NULL DEFAULT 'scheduled', "
+                "uploaded_file_name TEXT, uploaded_at TEXT)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS clips_date_state ON clips (date, state)")
+            # Schedules created before claims had an owner
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(clips)")]
+            if "owner" not in columns:
+                connection.execute("ALTER TABLE clips ADD COLUMN owner TEXT")
+                connection.execute("ALTER TABLE clips ADD COLUMN heartbeat REAL")
+
+        empty = connection.execute("SELECT COUNT(*) FROM days").fetchone()[0] == 0
+        if empty and self.legacy_json_path and os.path.exists(self.legacy_json_path):
+            self.import_json(connection, self.legacy_json_path)
+
+    def import_json(self, connection, json_path):
+        # One-time migration from the old 00_schedule.json layout
+        with open(json_path, 'r', encoding='utf-8') as file:
+            schedule_data = json.load(file)
+
+        with connection:
+            for day in schedule_data.get("scheduled_days", []):
+                connection.execute("INSERT OR IGNORE INTO days (date) VALUES (?)", (day["date"],))
+                for clip in day.get("clips", []):
+                    connection.execute(
+                        "INSERT INTO clips (date, time, title, description, file_name) VALUES (?, ?, ?, ?, ?)",
+                        (day["date"], *(clip.get(field) for field in CLIP_FIELDS)),
+                    )
+            for day in schedule_data.get("uploaded_to_yt", []):
+                connection.execute("INSERT OR IGNORE INTO days (date) VALUES (?)", (day["date"],))
+                for clip in day.get("clips", []):
+                    uploaded_file_name = clip.get("file_name") or ""
+                    file_name = uploaded_file_name[:-len("-yt.mp4")] if uploaded_file_name.endswith("-yt.mp4") else uploaded_file_name
+                    connection.execute(
+                        "INSERT INTO clips (date, time, title, description, file_name, state, uploaded_file_name, uploaded_at) "
+                        "VALUES (?, ?, ?, ?, ?, 'uploaded', ?, ?)",
+                        (day["date"], clip.get("time"), clip.get("title"), clip.get("description"), file_name, uploaded_file_name, clip.get("uploaded_at")),
+                    )
+        print(f"Imported the schedule from '{json_path}' into '{self.db_path}'.")
+
+    def last_scheduled_date(self):
+        with self.lock:
+            row = self.connect().execute("SELECT MAX(date) FROM days").fetchone()
+        return row[0]
+
+    def add_days(self, days):
+        # days is a list of (date_string, clips_info), written in a single transaction
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                for date_string, clips_info in days:
+                    connection.execute("INSERT OR IGNORE INTO days (date) VALUES (?)", (date_string,))
+                    connection.executemany(
+                        "INSERT INTO clips (date, time, title, description, file_name) VALUES (?, ?, ?, ?, ?)",
+                        [(date_string, *(clip[field] for field in CLIP_FIELDS)) for clip in clips_info],
+                    )
+
+    def clips_for_dates(self, dates, state="scheduled"):
+        placeholders = ",".join("?" * len(dates))
+        with self.lock:
+            rows = self.connect().execute(
+                f"SELECT * FROM clips WHERE date IN ({placeholders}) AND state = ? ORDER BY date, time, id",
+                (*dates, state),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def update_clip(self, clip_id, fields):
+        columns = [field for field in CLIP_FIELDS if field in fields]
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute(
+                    f"UPDATE clips SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+                    (*(fields[column] for column in columns), clip_id),
+                )
+
+    def transition(self, clip_id, from_state, to_state, claimed_by=None, **values):
+        # Compare-and-set, so two workers can never claim the same clip. claimed_by additionally
+        # requires the clip to be claimed by that run, a run never releases another run's claim.
+        assignments = ", ".join(["state = ?", *(f"{column} = ?" for column in values)])
+        condition = "id = ? AND state = ?" + (" AND owner = ?" if claimed_by else "")
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                cursor = connection.execute(
+                    f"UPDATE clips SET {assignments} WHERE {condition}",
+                    (to_state, *values.values(), clip_id, from_state, *([claimed_by] if claimed_by else [])),
+                )
+        return cursor.rowcount == 1
+
+    def mark_uploading(self, clip_id):
+        return self.transition(clip_id, "scheduled", "uploading", owner=self.owner, heartbeat=time.time())
+
+    def mark_uploaded(self, clip_id, uploaded_file_name, uploaded_at):
+        return self.transition(
+            clip_id, "uploading", "uploaded", self.owner,
+            uploaded_file_name=uploaded_file_name, uploaded_at=uploaded_at, owner=None, heartbeat=None,
+        )
+
+    def mark_scheduled(self, clip_id):
+        return self.transition(clip_id, "uploading", "scheduled", self.owner, owner=None, heartbeat=None)
+
+    def heartbeat(self):
+        # Called every HEARTBEAT_SECONDS while this run uploads, keeps recover() of other runs off its clips
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute(
+                    "UPDATE clips SET heartbeat = ? WHERE state = 'uploading' AND owner = ?", (time.time(), self.owner)
+                )
+
+    def recover(self, stale_seconds=STALE_SECONDS):
+        # Clips left in "uploading" by a run that stopped reporting go back to the queue, their upload
+        # session resumes. Claims of runs that are still alive are left alone.
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                cursor = connection.execute(
+                    "UPDATE clips SET state = 'scheduled', owner = NULL, heartbeat = NULL "
+                    "WHERE state = 'uploading' AND (heartbeat IS NULL OR heartbeat < ?)",
+                    (time.time() - stale_seconds,),
+                )
+        return cursor.rowcount
@@ -0,0 +1,113 @@
+import os
+import pickle
+import threading
+from datetime import datetime, timedelta
+
+import httplib2
+from apiclient.discovery import build_from_document
+from apiclient.http import build_http
+from oauth2client.client import flow_from_clientsecrets
+from oauth2client.file import Storage
+from oauth2client.tools import run_flow
+
+from lib.storage import atomic_write
+
+DISCOVERY_CACHE_DIR = ".discovery_cache"
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest"
+REFRESH_MARGIN = timedelta(minutes=5)  # Refresh access tokens this long before they expire
+
+# Credentials are shared by the whole process, services and their HTTP transport per thread
+# because httplib2.Http is not thread safe
+_lock = threading.Lock()
+_credentials = {}
+_local = threading.local()
+
+
+def discovery_document(api, version):
+    path = os.path.join(DISCOVERY_CACHE_DIR, f"{api}.{version}.json")
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read()
+
+    response, content = httplib2.Http().request(DISCOVERY_URL.format(api=api, version=version))
+    if response.status != 200:
+        raise RuntimeError(f"Could not fetch the discovery document for {api} {version}: HTTP {response.status}")
+    document = content.decode('utf-8')
+
+    with atomic_write(path) as file:
+        file.write(document)
+    return document
+
+def expires_soon(expiry):
+    # Both oauth2client and google-auth keep the expiry as a naive UTC datetime
+    return expiry is not None and expiry - datetime.utcnow() < REFRESH_MARGIN
+
+def thread_services():
+    if not hasattr(_local, "services"):
+        _local.services = {}
+    return _local.services
+
+def get_upload_credentials(client_secrets_file, scope, storage_path="oauth2.json"):
+    key = ("oauth2client", storage_path)
+    with _lock:
+        credentials = _credentials.get(key)
+        if credentials is None:
+            storage = Storage(storage_path)
+            credentials = storage.get()
+            if credentials is None or credentials.invalid:
+                flow = flow_from_clientsecrets(client_secrets_file, scope=scope)
+                credentials = run_flow(flow, storage)
+            _credentials[key] = credentials
+
+        # The storage is attached to the credentials, so a refresh is written back to oauth2.json
+        if credentials.access_token_expired or expires_soon(credentials.token_expiry):
+            credentials.refresh(httplib2.Http())
+    return credentials
+
+def get_upload_service(client_secrets_file, scope, api="youtube", version="v3"):
+    credentials = get_upload_credentials(client_secrets_file, scope)
+    services = thread_services()
+    key = ("oauth2client", client_secrets_file, scope, api, version)
+    if key not in services:
+        # One keep-alive transport per thread, authorized with the shared credentials. build_http keeps
+        # httplib2 from following the 308 "Resume Incomplete" answers of resumable uploads as redirects
+        http = credentials.authorize(build_http())
+        services[key] = build_from_document(discovery_document(api, version), http=http)
+    return services[key]
+
+def get_data_credentials(client_secrets_file, scopes, token_path="token.pickle"):
+    # Only the REPL uses the google-auth stack, keep it out of the uploader's imports
+    from google.auth.transport.requests import Request
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    key = ("google-auth", token_path)
+    with _lock:
+        credentials = _credentials.get(key)
+        if credentials is None and os.path.exists(token_path):
+            with open(token_path, 'rb') as token:
+                credentials = pickle.load(token)
+
+        changed = False
+        if credentials is not None and credentials.refresh_token and (not credentials.valid or expires_soon(credentials.expiry)):
+            credentials.refresh(Request())
+            changed = True
+        if credentials is None or not credentials.valid:
+            flow = InstalledAppFlow.from_client_secrets_file(client_secrets_file, scopes=scopes)
+            credentials = flow.run_local_server(port=0)
+            changed = True
+
+        if changed:
+            # Save the credentials for later use
+            with open(token_path, 'wb') as token:
+                pickle.dump(credentials, token)
+        _credentials[key] = credentials
+    return credentials
+
+def get_data_service(client_secrets_file, scopes, api="youtube", version="v3"):
+    credentials = get_data_credentials(client_secrets_file, scopes)
+    services = thread_services()
+    key = ("google-auth", client_secrets_file, tuple(scopes), api, version)
+    if key not in services:
+        # google-auth credentials refresh themselves inside the service's authorized transport
+        services[key] = build_from_document(discovery_document(api, version), credentials=credentials)
+    return services[key]
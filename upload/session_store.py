@@ -0,0 +1,59 @@
+import os
+import json
+import threading
+import time
+
+from lib.storage import atomic_write
+
+SESSION_FILE = "upload_sessions.json"
+SESSION_MAX_AGE = 6 * 24 * 60 * 60  # YouTube drops resumable sessions after about a week
+
+
+class UploadSessionStore():
+    def __init__(self, path=SESSION_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def key(self, file_path):
+        # A re-exported file with the same name must not resume someone else's session
+        stat = os.stat(file_path)
+        return f"{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except ValueError:
+            return {}
+
+    def write(self, sessions):
+        with atomic_write(self.path) as file:
+            json.dump(sessions, file, indent=4)
+
+    def get(self, file_path):
+        with self.lock:
+            session = self.load().get(self.key(file_path))
+        if session and time.time() - session["created_at"] < SESSION_MAX_AGE:
+            return session
+        return None
+
+    def save(self, file_path, uri, offset):
+        key = self.key(file_path)
+        with self.lock:
+            sessions = self.load()
+            session = sessions.get(key) or {"uri": uri, "created_at": time.time()}
+            if session["uri"] != uri:
+                session = {"uri": uri, "created_at": time.time()}
+            session["offset"] = offset
+            session["updated_at"] = time.time()
+            sessions[key] = session
+            self.write(sessions)
+
+    def remove(self, file_path):
+        key = self.key(file_path)
+        with self.lock:
+            sessions = self.load()
+            if sessions.pop(key, None) is not None:
+                self.write(sessions)
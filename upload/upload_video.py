@@ -8,16 +8,47 @@ import time
 import argparse
 from datetime import datetime
 
-from apiclient.discovery import build
 from apiclient.errors import HttpError
 from apiclient.http import MediaFileUpload
-from oauth2client.client import flow_from_clientsecrets
-from oauth2client.file import Storage
-from oauth2client.tools import argparser, run_flow
+
+from lib.best_frame import extract_best_thumbnail
+from lib.metrics import metrics
+from upload.chunking import AdaptiveChunkSize
+from upload.limiter import QuotaExceeded
+from upload.service_pool import get_upload_service
+from upload.session_store import UploadSessionStore
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024  # Must be a multiple of 256 KB
+MB = 1024 * 1024
+
+
+# Raised instead of exiting, the uploader runs inside REPL commands and worker threads
+class UploadFailed(Exception):
+    pass
+
+
+# The video is on YouTube, only setting its thumbnail ran into the quota. Callers stop uploading but keep the video.
+class ThumbnailQuotaExceeded(QuotaExceeded):
+    def __init__(self, message, video_id):
+        super().__init__(message)
+        self.video_id = video_id
+
+
+def format_progress(progress):
+    eta = progress["eta_seconds"]
+    return (
+        f"{progress['sent'] / progress['total'] * 100 if progress['total'] else 100:5.1f}% "
+        f"({progress['sent'] / MB:.1f}/{progress['total'] / MB:.1f} MB) at {progress['bytes_per_second'] / MB:.2f} MB/s, "
+        f"ETA {'?' if eta is None else f'{eta:.0f}s'}, chunk {progress['chunk_size'] / MB:g} MB"
+    )
+
+def print_progress(progress):
+    print(f"Uploading '{os.path.basename(progress['file'])}': {format_progress(progress)}")
+
 
 
 class YouTubeUploader:
-    def __init__(self, client_secrets_file):
+    def __init__(self, client_secrets_file, chunk_size=DEFAULT_CHUNK_SIZE, session_store=None, quota=None, bandwidth=None, interactive=True, progress=None):
         self.CLIENT_SECRETS_FILE = client_secrets_file
         self.YOUTUBE_UPLOAD_SCOPE = "https://www.googleapis.com/auth/youtube.upload"
         self.YOUTUBE_API_SERVICE_NAME = "youtube"
@@ -27,28 +58,55 @@ class YouTubeUploader:
         self.RETRIABLE_EXCEPTIONS = (httplib2.HttpLib2Error, IOError)
         self.RETRIABLE_STATUS_CODES = [500, 502, 503, 504]
         self.VALID_PRIVACY_STATUSES = ("public", "private", "unlisted")
+        self.EXPIRED_SESSION_STATUS_CODES = [404, 410]
+        self.retries = 0  # Totals over the uploader's lifetime, the throughput harness reports them
+        self.backoff_seconds = 0.0
+
+        # The session URI and acknowledged offset are saved after every chunk
+        self.CHUNK_SIZE = chunk_size
+        self.sessions = session_store or UploadSessionStore()
+        # Grow chunks on a stable link and halve them after a retriable failure, CHUNK_SIZE is only the start
+        self.ADAPTIVE_CHUNKS = True
+
+        # Called after every chunk with file, sent, total, bytes_per_second, eta_seconds and chunk_size
+        self.progress = progress or print_progress
+
+        # Optional shared limiters, a QuotaLimiter for API units and a TokenBucket for bytes/s
+        self.quota = quota
+        self.bandwidth = bandwidth
+
+        # Unattended runs never wait on input(), missing thumbnails are extracted from the video
+        self.INTERACTIVE = interactive
+        self.AUTO_THUMBNAIL = True
 
         self.DEFAULT_KEYWORDS = "movie clip, cinema, popular"
         self.DEFAULT_CATEGORY = "24"
         self.DEFAULT_PRIVACYSTATUS = "private"
 
     def get_authenticated_service(self):
-        flow = flow_from_clientsecrets(
+        # Credentials, discovery document and transport are cached by the service pool
+        return get_upload_service(
             self.CLIENT_SECRETS_FILE,
-            scope=self.YOUTUBE_UPLOAD_SCOPE
+            self.YOUTUBE_UPLOAD_SCOPE,
+            self.YOUTUBE_API_SERVICE_NAME,
+            self.YOUTUBE_API_VERSION
         )
 
-        storage = Storage("oauth2.json")
-        credentials = storage.get()
-
-        if credentials is None or credentials.invalid:
-            credentials = run_flow(flow, storage)
+    def reserve_quota(self, operation):
+        if self.quota is not None:
+            self.quota.reserve(operation)
 
-        return build(self.YOUTUBE_API_SERVICE_NAME, self.YOUTUBE_API_VERSION, http=credentials.authorize(httplib2.Http()))
+    def check_quota_error(self, error):
+        # 403 quotaExceeded / dailyLimitExceeded means nothing else can be uploaded today. rateLimitExceeded is
+        # only a short-term limit and must not mark the whole day's quota as used
+        if error.resp.status == 403 and (b"quotaExceeded" in error.content or b"dailyLimitExceeded" in error.content):
+            if self.quota is not None:
+                self.quota.exhaust()
+            raise QuotaExceeded("YouTube reported the daily quota as exhausted.")
 
     def initialize_upload(self, options):
         youtube = self.get_authenticated_service()
-        
+
         title = options.get("title", "Your Video Title")
         description = options.get("description", "Your video description")
         description_tail = f'''🎬Fair use.
@@ -80,21 +138,62 @@ class YouTubeUploader:
         if schedule_date_time:
             body["status"]["publishAt"] = schedule_date_time.strftime("%Y-%m-%dT%H:%M:%SZ")
 
+        chunk_size = options.get("chunksize", self.CHUNK_SIZE)
         insert_request = youtube.videos().insert(
             part=",".join(body.keys()),
             body=body,
-            media_body=MediaFileUpload(options["file"], chunksize=-1, resumable=True)
+            media_body=MediaFileUpload(options["file"], chunksize=chunk_size, resumable=True)
         )
+        # A resumed session continues the insert it was created by, only a new session costs quota
+        if not self.restore_session(insert_request, options["file"]):
+            self.reserve_quota("videos.insert")
 
         file_dir = os.path.dirname(options["file"])
-        self.resumable_upload(insert_request, file_dir, set_thumbnail)
-
-    def set_thumbnail(self, file_dir, video_id):
+        self.resumable_upload(insert_request, file_dir, set_thumbnail, options["file"])
+
+    def restore_session(self, insert_request, file_path):
+        session = self.sessions.get(file_path)
+        if session is None:
+            return False
+
+        print("Resuming upload of '%s' from byte %d." % (file_path, session["offset"]))
+        insert_request.resumable_uri = session["uri"]
+        insert_request.resumable_progress = session["offset"]
+        # Makes the next chunk ask the server for the offset it actually acknowledged
+        insert_request._in_error_state = True
+        return True
+
+    def reset_session(self, insert_request, file_path):
+        self.sessions.remove(file_path)
+        insert_request.resumable_uri = None
+        insert_request.resumable_progress = 0
+        insert_request._in_error_state = False
+
+    def find_thumbnail(self, file_dir, video_path=None):
+        # A per-video "<name>.jpg" wins over the folder-wide "thumbnail.jpg"
+        candidates = [os.path.join(file_dir, "thumbnail.jpg")]
+        if video_path:
+            candidates.insert(0, os.path.splitext(video_path)[0] + ".jpg")
+        for candidate in candidates:
+            if os.path.exists(candidate):
+                return candidate
+
+        # Nothing supplied, pick the best frame of the video itself
+        if video_path and self.AUTO_THUMBNAIL:
+            extracted = extract_best_thumbnail(video_path, candidates[0])
+            if extracted:
+                return extracted
+        return candidates[-1]
+
+    def set_thumbnail(self, file_dir, video_id, video_path=None):
         youtube = self.get_authenticated_service()
 
         # Check if thumbnail file exists
-        thumbnail_path = os.path.join(file_dir, "thumbnail.jpg")
+        thumbnail_path = self.find_thumbnail(file_dir, video_path)
         while not os.path.exists(thumbnail_path):
+            if not self.INTERACTIVE:
+                print(f"No thumbnail found for '{video_path or file_dir}', skipping.")
+                break
             print(f"Thumbnail file 'thumbnail.jpg' not found in the same folder as the video file.")
             choice = input(f"Upload the thumbnail to this folder '{file_dir}' and press Enter to continue, enter 'y' for manual input, enter 'n' to skip (y/n): ")
             if choice.lower() == 'y':
@@ -108,42 +207,129 @@ class YouTubeUploader:
         # Upload thumbnail
         if os.path.exists(thumbnail_path):
             print("Uploading thumbnail...")
+            self.reserve_quota("thumbnails.set")
             thumbnail_upload_request = youtube.thumbnails().set(
                 videoId=video_id,
                 media_body=MediaFileUpload(thumbnail_path)
             )
-            response = thumbnail_upload_request.execute()
+            try:
+                response = thumbnail_upload_request.execute()
+            except HttpError as e:
+                self.check_quota_error(e)
+                raise
             print("Thumbnail uploaded successfully.")
 
-    def resumable_upload(self, insert_request, file_dir, set_thumbnail):
+    def next_chunk_size(self, insert_request):
+        media = insert_request.resumable
+        remaining = media.size() - insert_request.resumable_progress
+        return remaining if media.chunksize() < 0 else min(media.chunksize(), remaining)
+
+    def record_upload(self, insert_request, file_path, start_offset, started, chunks, retries, backoff_seconds):
+        sent = insert_request.resumable.size() - start_offset
+        seconds = time.time() - started
+        metrics.count("upload_bytes_total", sent)
+        metrics.observe("upload_seconds", seconds)
+        metrics.set("upload_bytes_per_second", round(sent / seconds) if seconds > 0 else 0)
+        metrics.record(
+            "upload", file=file_path, bytes=sent, seconds=round(seconds, 3),
+            bytes_per_second=round(sent / seconds) if seconds > 0 else 0, chunks=chunks, retries=retries,
+            backoff_seconds=round(backoff_seconds, 3),
+        )
+
+    def report_progress(self, insert_request, file_path, sent, start_offset, started):
+        media = insert_request.resumable
+        # The rate includes backoff and throttling, so the ETA is what the caller will actually wait
+        elapsed = time.time() - started
+        rate = (sent - start_offset) / elapsed if elapsed > 0 else 0
+        self.progress({
+            "file": file_path or "",
+            "sent": sent,
+            "total": media.size(),
+            "bytes_per_second": rate,
+            "eta_seconds": (media.size() - sent) / rate if rate > 0 else None,
+            "chunk_size": media.chunksize(),
+        })
+
+    def resumable_upload(self, insert_request, file_dir, set_thumbnail, file_path=None):
         response = None
         error = None
         retry = 0
-
+        # Per upload, a resumed session only counts the bytes sent in this run
+        started = time.time()
+        start_offset = insert_request.resumable_progress
+        chunks = 0
+        retries = 0
+        backoff_seconds = 0.0
+
+        # A chunk size of -1 sends the whole file in one request, without progress and with a full retransmit on failure
+        media = insert_request.resumable
+        sizer = None
+        if self.ADAPTIVE_CHUNKS:
+            sizer = AdaptiveChunkSize(media.chunksize() if media.chunksize() > 0 else DEFAULT_CHUNK_SIZE)
+            media._chunksize = sizer.size
+
+        print("Uploading file...")
         while response is None:
+            error = None
             try:
-                print("Uploading file...")
+                if self.bandwidth is not None:
+                    self.bandwidth.consume(self.next_chunk_size(insert_request))
+                offset = insert_request.resumable_progress
+                chunk_started = time.time()
                 status, response = insert_request.next_chunk()
+                chunks += 1
+                # The retry limit and backoff apply per request, an acknowledged chunk starts them over
+                retry = 0
+                metrics.count("upload_chunks_total")
+
+                # The final response leaves resumable_progress at the start of the last chunk
+                position = media.size() if response is not None else insert_request.resumable_progress
+                if sizer is not None and response is None:
+                    media._chunksize = sizer.success(position - offset, time.time() - chunk_started)
+                self.report_progress(insert_request, file_path, position, start_offset, started)
+
+                if response is None and file_path and insert_request.resumable_uri:
+                    self.sessions.save(file_path, insert_request.resumable_uri, insert_request.resumable_progress)
 
                 if response is not None:
+                    if file_path:
+                        self.sessions.remove(file_path)
+
                     if 'id' in response:
                         video_id = response['id']
                         print("Video id '%s' was successfully uploaded." % video_id)
+                        self.record_upload(insert_request, file_path, start_offset, started, chunks, retries, backoff_seconds)
 
                         # Write the video ID to a text file
                         with open('yt_upload.txt', 'w') as f:
                             f.write(f"id={video_id}\n")
 
                         if set_thumbnail:
-                            self.set_thumbnail(file_dir, video_id)
+                            # The video is already on YouTube, a missing thumbnail must not make the caller
+                            # treat the upload as failed and upload the same video again
+                            try:
+                                self.set_thumbnail(file_dir, video_id, file_path)
+                            except QuotaExceeded as e:
+                                metrics.count("thumbnail_failures_total")
+                                raise ThumbnailQuotaExceeded("Video id '%s' was uploaded without its thumbnail: %s" % (video_id, e), video_id)
+                            except Exception as e:
+                                print("Setting the thumbnail of video id '%s' failed: %s" % (video_id, e))
+                                metrics.count("thumbnail_failures_total")
 
                     else:
-                        exit("The upload failed with an unexpected response: %s" % response)
+                        raise UploadFailed("The upload failed with an unexpected response: %s" % response)
 
             except HttpError as e:
-                if e.resp.status in self.RETRIABLE_STATUS_CODES:
+                if e.resp.status in self.EXPIRED_SESSION_STATUS_CODES and file_path and insert_request.resumable_uri:
+                    # The saved session expired on the server, start a fresh one
+                    print("Upload session expired, restarting the upload.")
+                    self.reset_session(insert_request, file_path)
+                    self.reserve_quota("videos.insert")
+                    continue
+                elif e.resp.status in self.RETRIABLE_STATUS_CODES:
                     error = "A retriable HTTP error %d occurred:\n%s" % (e.resp.status, e.content)
                 else:
+                    self.check_quota_error(e)
                     raise
             except self.RETRIABLE_EXCEPTIONS as e:
                 error = "A retriable error occurred: %s" % e
@@ -151,13 +337,21 @@ class YouTubeUploader:
             if error is not None:
                 print(error)
                 retry += 1
+                retries += 1
+                if sizer is not None:
+                    media._chunksize = sizer.failure()
+                self.retries += 1
+                metrics.count("upload_retries_total")
 
                 if retry > self.MAX_RETRIES:
-                    exit("No longer attempting to retry.")
+                    raise UploadFailed("No longer attempting to retry.")
 
                 max_sleep = 2 ** retry
                 sleep_seconds = random.random() * max_sleep
                 print("Sleeping %f seconds and then retrying..." % sleep_seconds)
+                self.backoff_seconds += sleep_seconds
+                backoff_seconds += sleep_seconds
+                metrics.count("upload_backoff_seconds_total", sleep_seconds)
                 time.sleep(sleep_seconds)
 
 
@@ -184,4 +378,7 @@ if __name__ == '__main__':
     }
 
     uploader = YouTubeUploader("client_secrets.json")
-    uploader.initialize_upload(args)
+    try:
+        uploader.initialize_upload(args)
+    except UploadFailed as e:
+        exit(str(e))